@@ -12,8 +12,8 @@ import numpy as np
 
 from wmpl.Formats.GenericArgumentParser import addSolverOptions
 from wmpl.Formats.Milig import StationData, writeMiligInputFile
-from wmpl.Utils.TrajConversions import J2000_JD, date2JD, equatorialCoordPrecession_vect, raDec2AltAz_vect, \
-    jd2Date
+from wmpl.Utils.TrajConversions import J2000_JD, date2JD, equatorialPrecessionMatrix, \
+    equatorialCoordPrecessionMatrix, raDec2AltAz_vect, jd2Date
 from wmpl.Trajectory.Trajectory import Trajectory
 from wmpl.Trajectory.GuralTrajectory import GuralTrajectory
 from wmpl.Utils.Math import averageClosePoints, angleBetweenSphericalCoords
@@ -26,6 +26,10 @@ class MeteorObservation(object):
         The loaded points are RA and Dec in J2000 epoch, in radians.
     """
 
+    __slots__ = ('jdt_ref', 'station_id', 'latitude', 'longitude', 'height', 'fps', 'ff_name', 'frames', \
+        'time_data', 'x_data', 'y_data', 'azim_data', 'elev_data', 'ra_data', 'dec_data', 'mag_data', \
+        'abs_mag_data')
+
     def __init__(self, jdt_ref, station_id, latitude, longitude, height, fps, ff_name=None):
 
         self.jdt_ref = jdt_ref
@@ -85,24 +89,32 @@ class MeteorObservation(object):
 
 
     def finish(self):
-        """ When the initialization is done, convert data lists to numpy arrays. """
+        """ When the initialization is done, convert data lists to numpy arrays and sort the points by frame. """
+
+        self.frames = np.asarray(self.frames)
+        self.time_data = np.asarray(self.time_data)
+        self.x_data = np.asarray(self.x_data)
+        self.y_data = np.asarray(self.y_data)
+        self.azim_data = np.asarray(self.azim_data)
+        self.elev_data = np.asarray(self.elev_data)
+        self.ra_data = np.asarray(self.ra_data)
+        self.dec_data = np.asarray(self.dec_data)
+        self.mag_data = np.asarray(self.mag_data)
+
+        # Sort by frame, if the points are not already sorted
+        if np.any(np.diff(self.frames) < 0):
 
-        self.frames = np.array(self.frames)
-        self.time_data = np.array(self.time_data)
-        self.x_data = np.array(self.x_data)
-        self.y_data = np.array(self.y_data)
-        self.azim_data = np.array(self.azim_data)
-        self.elev_data = np.array(self.elev_data)
-        self.ra_data = np.array(self.ra_data)
-        self.dec_data = np.array(self.dec_data)
-        self.mag_data = np.array(self.mag_data)
+            sort_ind = np.argsort(self.frames)
 
-        # Sort by frame
-        temp_arr = np.c_[self.frames, self.time_data, self.x_data, self.y_data, self.azim_data, \
-        self.elev_data, self.ra_data, self.dec_data, self.mag_data]
-        temp_arr = temp_arr[np.argsort(temp_arr[:, 0])]
-        self.frames, self.time_data, self.x_data, self.y_data, self.azim_data, self.elev_data, self.ra_data, \
-            self.dec_data, self.mag_data = temp_arr.T
+            self.frames = self.frames[sort_ind]
+            self.time_data = self.time_data[sort_ind]
+            self.x_data = self.x_data[sort_ind]
+            self.y_data = self.y_data[sort_ind]
+            self.azim_data = self.azim_data[sort_ind]
+            self.elev_data = self.elev_data[sort_ind]
+            self.ra_data = self.ra_data[sort_ind]
+            self.dec_data = self.dec_data[sort_ind]
+            self.mag_data = self.mag_data[sort_ind]
 
 
 
@@ -592,14 +604,16 @@ def prepareObservations(meteor_list):
 
 
         ### Precess observations from J2000 to the epoch of date
+
+        # All meteors share the same reference JD, so the precession matrix is computed only once
+        prec_mat = equatorialPrecessionMatrix(J2000_JD.days, jdt_ref)
+
         meteor_list_epoch_of_date = []
         for meteor in meteor_list_tcorr:
 
-            jdt_ref_vect = np.zeros_like(meteor.ra_data) + jdt_ref
-
             # Precess from J2000 to the epoch of date
-            ra_prec, dec_prec = equatorialCoordPrecession_vect(J2000_JD.days, jdt_ref_vect, meteor.ra_data, 
-                meteor.dec_data)
+            ra_prec, dec_prec = equatorialCoordPrecessionMatrix(meteor.ra_data, meteor.dec_data, 
+                prec_mat)
 
             meteor.ra_data = ra_prec
             meteor.dec_data = dec_prec
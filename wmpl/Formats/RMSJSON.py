@@ -3,99 +3,315 @@
 
 import os
 import sys
+import math
+import mmap
 import glob
 import json
 import argparse
+import itertools
+import threading
+import concurrent.futures
 
 import numpy as np
 
-from wmpl.Formats.CAMS import MeteorObservation, prepareObservations
+# Use orjson or simdjson for parsing if they are available, as they are much faster than the standard 
+#   library json module
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import simdjson
+    SIMDJSON_AVAILABLE = True
+
+except ImportError:
+    SIMDJSON_AVAILABLE = False
+
+from wmpl.Formats.CAMS import MeteorObservation
 from wmpl.Formats.GenericArgumentParser import addSolverOptions
 from wmpl.Trajectory.Trajectory import Trajectory
 from wmpl.Trajectory.GuralTrajectory import GuralTrajectory
-from wmpl.Utils.TrajConversions import jd2Date
+from wmpl.Utils.TrajConversions import J2000_JD, jd2Date, equatorialPrecessionMatrix, \
+    equatorialCoordPrecessionMatrix, raDec2AltAz
 
 
 
-def initMeteorObjects(json_list):
+# JSON files larger than this size (in bytes) are memory mapped instead of read into memory, when parsed 
+#   with orjson
+JSON_MMAP_MIN_SIZE = 8*1024**2
 
-    # Init meteor objects
-    meteor_list = []
-    for j in json_list:
 
-        # Init the meteor object
-        meteor = MeteorObservation(j['jdt_ref'], j['station']['station_id'], \
-            np.radians(j['station']['lat']), np.radians(j['station']['lon']), j['station']['elev'], j['fps'])
+# simdjson parsers are reused between files to avoid reallocating their internal buffers. A parser can 
+#   only be used by one thread at a time, so every loading thread gets its own
+_simdjson_local = threading.local()
+
+
+def _simdjsonParser():
+    """ Return the simdjson parser for the current thread. """
+
+    parser = getattr(_simdjson_local, 'parser', None)
+
+    if parser is None:
+        parser = simdjson.Parser()
+        _simdjson_local.parser = parser
+
+    return parser
+
+
+
+def loadJSON(json_file):
+    """ Load an RMS JSON file. orjson or simdjson are used for parsing if they are installed, otherwise the 
+        standard library json module is used.
+
+    Arguments:
+        json_file: [str] Path to the JSON file.
+
+    Return:
+        [dict] Loaded JSON data.
+    """
+
+    # Read raw bytes, all parsers accept them directly so there is no need to decode the file to a string 
+    #   first
+    with open(json_file, 'rb') as f:
+
+        # Parse large files directly from the memory mapped file, so they are not copied into memory first
+        if ORJSON_AVAILABLE and (os.fstat(f.fileno()).st_size >= JSON_MMAP_MIN_SIZE):
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as data:
+                    return orjson.loads(data)
+
+        data = f.read()
+
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+
+    elif SIMDJSON_AVAILABLE:
+
+        # The parsed document is only valid until the parser is used again, so convert it to a dictionary
+        return _simdjsonParser().parse(data).as_dict()
+
+    else:
+        return json.loads(data)
+
+
+
+def loadJSONFiles(json_paths, max_workers=8):
+    """ Load multiple RMS JSON files in parallel threads, so the file reads overlap.
+
+    Arguments:
+        json_paths: [list] A list of paths to JSON files.
+
+    Keyword arguments:
+        max_workers: [int] Maximum number of threads used for loading. 8 by default.
+
+    Return:
+        [list] A list of loaded JSON data, in the same order as the given paths.
+    """
+
+    if not json_paths:
+        return []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(json_paths))) as executor:
+        return list(executor.map(loadJSON, json_paths))
+
+
+
+def centroidsToArray(centroids, source=None):
+    """ Convert the list of RMS JSON centroids to a 2D numpy array. The values are read directly from a 
+        flattened iterator, which is faster than letting numpy discover the shape of the nested lists.
+
+    Arguments:
+        centroids: [list] A list of centroids, each given as a list of: t_rel, x, y, ra, dec, intensity_sum,
+            mag.
+
+    Keyword arguments:
+        source: [str] Name of the file the centroids were loaded from, used in the error message. None by 
+            default.
+
+    Return:
+        [ndarray] An (N, 7) array of centroids.
+    """
+
+    n_centroids = len(centroids)
+
+    # Every centroid must have exactly 7 values, otherwise the flattened values would be silently shifted
+    bad_rows = [i for i, row in enumerate(centroids) if len(row) != 7]
+    if bad_rows:
+        raise ValueError("Centroid {:d} in {:s} has {:d} values instead of 7!".format(bad_rows[0], 
+            str(source), len(centroids[bad_rows[0]])))
+
+    return np.fromiter(itertools.chain.from_iterable(centroids), dtype=np.float64, 
+        count=7*n_centroids).reshape(n_centroids, 7)
+
+
+
+def initMeteorObjects(json_list, json_paths=None):
+    """ Init MeteorObservation objects from the loaded RMS JSON data. All observations are normalized to the 
+        same reference Julian date and precessed from J2000 to the epoch of date, which is equivalent to 
+        running prepareObservations from the CAMS module on the loaded meteors.
+
+    Arguments:
+        json_list: [list] A list of loaded RMS JSON data.
+
+    Keyword arguments:
+        json_paths: [list] Paths to the JSON files in the same order as json_list, used in error messages.
+            None by default, in which case the station IDs are used.
 
-        # Add data to meteor object
-        for entry in j['centroids']:
-            t_rel, x_centroid, y_centroid, ra, dec, intensity_sum, mag = entry
+    Return:
+        (jdt_ref, meteor_list):
+            - jdt_ref: [float] reference Julian date for which t = 0
+            - meteor_list: [list] A list a MeteorObservations whose time is normalized to jdt_ref, and are
+                precessed to the epoch of date
 
-            meteor.addPoint(t_rel*j['fps'], x_centroid, y_centroid, 0.0, 0.0, ra, dec, mag)
+    """
 
-        meteor.finish()
+    if not json_list:
+        return None, None
+
+
+    # Load the centroids of all meteors (columns: t_rel, x, y, ra, dec, intensity_sum, mag), sorted by time
+    if json_paths is None:
+        json_paths = ['the JSON file of station ' + str(j['station']['station_id']) for j in json_list]
+
+    centroids_list = []
+    for j, json_path in zip(json_list, json_paths):
+        centroids = centroidsToArray(j['centroids'], source=json_path)
+        centroids_list.append(centroids[np.argsort(centroids[:, 0])])
+
+    meteor_lens = [len(centroids) for centroids in centroids_list]
+    meteor_ends = np.cumsum(meteor_lens)
+    meteor_begs = meteor_ends - meteor_lens
+
+    # Stack the centroids of all meteors, so all points are processed at once
+    t_rel, x_centroid, y_centroid, ra, dec, _, mag = np.concatenate(centroids_list).T
+
+    # Per point FPS and station coordinates
+    fps_all = np.repeat([j['fps'] for j in json_list], meteor_lens)
+    lat_all = np.repeat([math.radians(j['station']['lat']) for j in json_list], meteor_lens)
+    lon_all = np.repeat([math.radians(j['station']['lon']) for j in json_list], meteor_lens)
+
+
+    ### Normalize all times to the beginning of the first meteor
+
+    # The first meteor is the reference one, normalize its first point to have t = 0 and set the JD to 
+    #   that point
+    tsec_delta = t_rel[0]
+    jdt_ref = json_list[0]['jdt_ref'] + tsec_delta/86400.0
+
+    # Compute the time offset of every meteor from the reference JD
+    time_offsets = np.array([(j['jdt_ref'] - jdt_ref)*86400.0 for j in json_list])
+    time_offsets[0] = -tsec_delta
+
+    ######
+
+
+    ### Precess observations from J2000 to the epoch of date
+
+    # All meteors share the same reference JD, so the precession matrix is computed only once
+    prec_mat = equatorialPrecessionMatrix(J2000_JD.days, jdt_ref)
+
+    ra_all, dec_all = equatorialCoordPrecessionMatrix(np.radians(ra), np.radians(dec), prec_mat)
+
+    # Convert preccesed Ra, Dec to altitude and azimuth
+    azim_all, elev_all = raDec2AltAz(ra_all, dec_all, jdt_ref, lat_all, lon_all)
+
+    ######
+
+
+    # All points are stored in a single structure of arrays, each array is contiguous in memory
+    frames_all = t_rel*fps_all
+    time_all = t_rel + np.repeat(time_offsets, meteor_lens)
+    x_all = np.ascontiguousarray(x_centroid)
+    y_all = np.ascontiguousarray(y_centroid)
+    mag_all = np.ascontiguousarray(mag)
+
+
+    # Init meteor objects, their data are views into the shared arrays so nothing is copied
+    meteor_list = []
+    for j, beg, end in zip(json_list, meteor_begs, meteor_ends):
+
+        # The station coordinates are scalars, so math.radians is used instead of numpy
+        meteor = MeteorObservation(jdt_ref, j['station']['station_id'], math.radians(j['station']['lat']), 
+            math.radians(j['station']['lon']), j['station']['elev'], j['fps'])
+
+        meteor.frames = frames_all[beg:end]
+        meteor.time_data = time_all[beg:end]
+        meteor.x_data = x_all[beg:end]
+        meteor.y_data = y_all[beg:end]
+        meteor.azim_data = azim_all[beg:end]
+        meteor.elev_data = elev_all[beg:end]
+        meteor.ra_data = ra_all[beg:end]
+        meteor.dec_data = dec_all[beg:end]
+        meteor.mag_data = mag_all[beg:end]
 
         meteor_list.append(meteor)
 
 
-    # Normalize all observations to the same JD and precess from J2000 to the epoch of date
-    return prepareObservations(meteor_list)
+    return jdt_ref, meteor_list
 
 
 
 
-def solveTrajectoryRMS(json_list, dir_path, solver='original', **kwargs):
+def solveTrajectoryRMS(json_list, dir_path, solver='original', json_paths=None, **kwargs):
     """ Feed the list of meteors in the trajectory solver. """
 
 
+    # Check the solver before loading the observations
+    is_gural = solver.lower().startswith('gural')
+    if is_gural:
+
+        # The Gural velocity model can be given as a single digit (e.g. gural3), the model 0 is used if 
+        #   it is not given
+        velmodel_str = solver[len('gural'):]
+        valid_solver = (velmodel_str == '') or ((len(velmodel_str) == 1) and velmodel_str.isdigit())
+
+    else:
+        valid_solver = (solver == 'original')
+
+    if not valid_solver:
+        print('No such solver:', solver)
+        return
+
+    velmodel = 0
+    if is_gural and velmodel_str:
+        velmodel = int(velmodel_str)
+
+
     # Normalize the observations to the same reference Julian date and precess them from J2000 to the 
     # epoch of date
-    jdt_ref, meteor_list = initMeteorObjects(json_list)
+    jdt_ref, meteor_list = initMeteorObjects(json_list, json_paths=json_paths)
 
     # Create name of output directory
     output_dir = os.path.join(dir_path, jd2Date(jdt_ref, dt_obj=True).strftime("%Y%m%d-%H%M%S.%f"))
 
 
     # Init the trajectory solver
-    if solver == 'original':
-        traj = Trajectory(jdt_ref, output_dir=output_dir, meastype=1, **kwargs)
-
-    elif solver.lower().startswith('gural'):
-        velmodel = solver.lower().strip('gural')
-        if len(velmodel) == 1:
-            velmodel = int(velmodel)
-        else:
-            velmodel = 0
-
+    if is_gural:
         traj = GuralTrajectory(len(meteor_list), jdt_ref, velmodel=velmodel, meastype=1, verbose=1, 
             output_dir=output_dir)
 
     else:
-        print('No such solver:', solver)
-        return 
-
-
-    # Add meteor observations to the solver
-    for meteor in meteor_list:
-
-        if solver == 'original':
+        traj = Trajectory(jdt_ref, output_dir=output_dir, meastype=1, **kwargs)
 
-            traj.infillTrajectory(meteor.ra_data, meteor.dec_data, meteor.time_data, meteor.latitude, 
-                meteor.longitude, meteor.height, station_id=meteor.station_id, \
-                magnitudes=meteor.mag_data)
 
-        elif solver.lower().startswith('gural'):
+    # Add meteor observations to the solver (the solver type is checked only once, outside the loop)
+    infillTrajectory = traj.infillTrajectory
+    if is_gural:
 
-            # Extract velocity model is given
-            try:
-                velmodel = int(solver[-1])
+        # The Gural solver does not take station IDs and magnitudes
+        for meteor in meteor_list:
+            infillTrajectory(meteor.ra_data, meteor.dec_data, meteor.time_data, meteor.latitude, 
+                meteor.longitude, meteor.height)
 
-            except: 
-                # Default to the exponential model
-                velmodel = 3
+    else:
 
-            traj.infillTrajectory(meteor.ra_data, meteor.dec_data, meteor.time_data, meteor.latitude, 
-                meteor.longitude, meteor.height)
+        for meteor in meteor_list:
+            infillTrajectory(meteor.ra_data, meteor.dec_data, meteor.time_data, meteor.latitude, 
+                meteor.longitude, meteor.height, station_id=meteor.station_id, magnitudes=meteor.mag_data)
 
 
     # Solve the trajectory
@@ -131,18 +347,24 @@ if __name__ == "__main__":
 
     ### Parse command line arguments ###
 
-    json_paths = []
-    print('Using JSON files:')
+    # Expand the given patterns, keeping the order in which files were given and skipping duplicates. glob 
+    #   only returns existing paths, so no additional existence check is needed
+    json_paths = {}
     for json_p in cml_args.json_files:
-        for json_full_p in glob.glob(json_p):
-            json_full_path = os.path.abspath(json_full_p)
 
-            # Check that the path exists
-            if os.path.exists(json_full_path):
-                json_paths.append(json_full_path)
-                print(json_full_path)
-            else:
-                print('File not found:', json_full_path)
+        found = False
+        for json_full_p in glob.iglob(json_p):
+            json_paths[os.path.abspath(json_full_p)] = None
+            found = True
+
+        if not found:
+            print('File not found:', os.path.abspath(json_p))
+
+    json_paths = list(json_paths)
+
+    print('Using JSON files:')
+    for json_full_path in json_paths:
+        print(json_full_path)
 
 
     # Check that there are more than 2 JSON files given
@@ -171,17 +393,13 @@ if __name__ == "__main__":
 
 
     # Load all json files
-    json_list = []
-    for json_file in json_paths:
-        with open(json_file) as f:
-            data = json.load(f)
-            json_list.append(data)
+    json_list = loadJSONFiles(json_paths)
 
 
 
     # Init the trajectory structure
-    traj = solveTrajectoryRMS(json_list, dir_path, solver=cml_args.solver, max_toffset=max_toffset, \
-            monte_carlo=(not cml_args.disablemc), mc_runs=cml_args.mcruns, \
+    traj = solveTrajectoryRMS(json_list, dir_path, solver=cml_args.solver, json_paths=json_paths, \
+            max_toffset=max_toffset, monte_carlo=(not cml_args.disablemc), mc_runs=cml_args.mcruns, \
             geometric_uncert=cml_args.uncertgeom, gravity_correction=(not cml_args.disablegravity), 
             plot_all_spatial_residuals=cml_args.plotallspatial, plot_file_type=cml_args.imgformat, \
             show_plots=(not cml_args.hideplots), v_init_part=velpart, v_init_ht=vinitht)
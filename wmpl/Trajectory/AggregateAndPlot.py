@@ -4,27 +4,35 @@ from __future__ import print_function, division, absolute_import
 
 
 import os
+import math
 import datetime
+import functools
+import collections
+import multiprocessing
+from operator import attrgetter
 
 import numpy as np
 import scipy.stats
 import scipy.ndimage
 
 
-from wmpl.Utils.Math import averageClosePoints, meanAngle, sphericalPointFromHeadingAndDistance
-from wmpl.Utils.Physics import calcMass
+from wmpl.Utils.Math import sphericalPointFromHeadingAndDistance
+from wmpl.Utils.Physics import calcMassLightCurve
 from wmpl.Utils.Pickling import loadPickle
 from wmpl.Utils.PlotCelestial import CelestialPlot
 from wmpl.Utils.PlotMap import MapColorScheme
 from wmpl.Utils.ShowerAssociation import associateShowerTraj, MeteorShower
 from wmpl.Utils.SolarLongitude import jd2SolLonSteyaert
-from wmpl.Utils.TrajConversions import jd2Date
+from wmpl.Utils.TrajConversions import jd2Date_vect
 
 
 
 
 ### CONSTANTS ###
     
+# Radians to degrees conversion factor, scalars are multiplied by it directly instead of calling np.degrees
+RAD2DEG = math.degrees(1.0)
+
 # Trajectory summary file name
 TRAJ_SUMMARY_FILE = "trajectory_summary.txt"
 
@@ -35,237 +43,460 @@ MIN_SHOWER_MEMBERS = 3
 # Plot shower radius (deg)
 PLOT_SHOWER_RADIUS = 3.0
 
+# Trajectory values used for orbit plots
+TRAJ_PLOT_ATTRS = ['jdt_ref', 'orbit.e', 'orbit.L_g', 'orbit.B_g', 'orbit.v_g', 'orbit.la_sun']
+
+
+# Delimiter between columns of the trajectory summary file
+SUMMARY_DELIMITER = "; "
+
+# Trajectory summary file header (column names and units)
+SUMMARY_HEADER = ["   Beginning      ", "       Beginning          ", "  IAU", " IAU", "  Sol lon ", "  App LST ", "  RAgeo  ", "  +/-  ", "  DECgeo ", "  +/-  ", " LAMgeo  ", "  +/-  ", "  BETgeo ", "  +/-  ", "   Vgeo  ", "   +/- ", " LAMhel  ", "  +/-  ", "  BEThel ", "  +/-  ", "   Vhel  ", "   +/- ", "      a    ", "  +/-  ", "     e    ", "  +/-  ", "     i    ", "  +/-  ", "   peri   ", "   +/-  ", "   node   ", "   +/-  ", "    Pi    ", "  +/-  ", "     q    ", "  +/-  ", "     f    ", "  +/-  ", "     M    ", "  +/-  ", "      Q    ", "  +/-  ", "     n    ", "  +/-  ", "     T    ", "  +/-  ", "TisserandJ", "  +/-  ", "  RAapp  ", "  +/-  ", "  DECapp ", "  +/-  ", " Azim +E ", "  +/-  ", "   Elev  ", "  +/-  ", "  Vinit  ", "   +/- ", "   Vavg  ", "   +/- ", "   LatBeg   ", "  +/-  ", "   LonBeg   ", "  +/-  ", "  HtBeg ", "  +/-  ", "   LatEnd   ", "  +/-  ", "   LonEnd   ", "  +/-  ", "  HtEnd ", "  +/-  ", "Duration", " Peak ", " Peak Ht", " Mass kg", "  Qc ", "MedianFitErr", "Beg in", "End in", " Num", "     Participating    "]
+SUMMARY_HEADER_UNITS = ["  Julian date     ", "        UTC Time          ", "   No", "code", "    deg   ", "    deg   ", "   deg   ", " sigma ", "   deg   ", " sigma ", "   deg   ", " sigma ", "    deg  ", " sigma ", "   km/s  ", "  sigma", "   deg   ", " sigma ", "    deg  ", " sigma ", "   km/s  ", "  sigma", "     AU    ", " sigma ", "          ", " sigma ", "   deg    ", " sigma ", "    deg   ", "  sigma ", "    deg   ", "  sigma ", "   deg    ", " sigma ", "    AU    ", " sigma ", "   deg    ", " sigma ", "    deg   ", " sigma ", "     AU    ", " sigma ", "  deg/day ", " sigma ", "   years  ", " sigma ", "          ", " sigma ", "   deg   ", " sigma ", "   deg   ", " sigma ", "of N  deg", " sigma ", "    deg  ", " sigma ", "   km/s  ", "  sigma", "   km/s  ", "  sigma", "   +N deg   ", " sigma ", "   +E deg   ", " sigma ", "    km  ", " sigma ", "   +N deg   ", " sigma ", "   +E deg   ", " sigma ", "    km  ", " sigma ", "  sec   ", "AbsMag", "    km  ", "tau=0.7%", " deg ", "   arcsec   ", "  FOV ", "  FOV ", "stat", "        stations      "]
+
+# Header lines of the trajectory summary file, with a horizontal line below them
+SUMMARY_HEADER_LINES = "".join(["# {:s}\n\r".format(line) for line in [
+    SUMMARY_DELIMITER.join(SUMMARY_HEADER), 
+    SUMMARY_DELIMITER.join(SUMMARY_HEADER_UNITS),
+    SUMMARY_DELIMITER.join(["-"*len(entry) for entry in SUMMARY_HEADER])
+    ]])
+
 ### ###
 
 
 
-def writeOrbitSummaryFile(dir_path, traj_list, P_0m=1210):
-    """ Given a list of trajectory files, generate CSV file with the orbit summary. """
+def attributeColumns(obj_list, attrs):
+    """ Read the given attributes of all objects into numpy arrays, in a single pass over the objects.
 
-    def _uncer(traj, str_format, std_name, multi=1.0, deg=False, max_val=None, max_val_format="{:7.1e}"):
-        """ Internal function. Returns the formatted uncertanty, if the uncertanty is given. If not,
-            it returns nothing. 
+    Arguments:
+        obj_list: [list] A list of objects.
+        attrs: [list] Names of attributes to read, dotted names (e.g. 'orbit.e') are supported. None values 
+            are converted to NaN.
 
-        Arguments:
-            traj: [Trajectory instance]
-            str_format: [str] String format for the unceertanty.
-            std_name: [str] Name of the uncertanty attribute, e.g. if it is 'x', then the uncertanty is 
-                stored in uncertainties.x.
-    
-        Keyword arguments:
-            multi: [float] Uncertanty multiplier. 1.0 by default. This is used to scale the uncertanty to
-                different units (e.g. from m/s to km/s).
-            deg: [bool] Converet radians to degrees if True. False by defualt.
-            max_val: [float] Larger number to use the given format. If the value is larger than that, the
-                max_val_format is used.
-            max_val_format: [str]
-            """
+    Return:
+        [dict] Arrays of attribute values, keyed by the attribute name.
+    """
 
-        if deg:
-            multi *= np.degrees(1.0)
+    getter = attrgetter(*attrs)
 
-        if traj.uncertainties is not None:
-            if hasattr(traj.uncertainties, std_name):
+    # One row per object
+    arr = np.array([getter(obj) for obj in obj_list], dtype=np.float64).reshape(len(obj_list), len(attrs))
 
-                # Get the value
-                val = getattr(traj.uncertainties, std_name)*multi
+    return dict(zip(attrs, arr.T))
 
-                # If the value is too big, use scientific notation
-                if max_val is not None:
-                    if val > max_val:
-                        str_format = max_val_format
 
-                return str_format.format(val)
 
-        
-        return "None"
+def summaryColumns(traj_list):
+    """ Extract the values written to the orbit summary file from all trajectories into numpy arrays, so they 
+        can be converted and formatted for all trajectories at once.
 
-    # Sort trajectories by Julian date
-    traj_list = sorted(traj_list, key=lambda x: x.jdt_ref)
+    Arguments:
+        traj_list: [list] A list of Trajectory objects.
 
+    Return:
+        (orbit_cols, traj_cols, uncer_cols):
+            - orbit_cols: [dict] Arrays of orbit values, keyed by the name of the attribute in traj.orbit.
+            - traj_cols: [dict] Arrays of trajectory values, keyed by the name of the attribute in traj.
+            - uncer_cols: [dict] Masked arrays of uncertainties, keyed by the name of the attribute in 
+                traj.uncertainties. Uncertainties which are not given (also when traj.uncertainties is None)
+                are masked.
+    """
 
-    delimiter = "; "
+    orbit_attrs = ['la_sun', 'lst_ref', 'ra_g', 'dec_g', 'L_g', 'B_g', 'v_g', 'L_h', 'B_h', 'v_h', 'a', 'e', \
+        'i', 'peri', 'node', 'pi', 'q', 'true_anomaly', 'mean_anomaly', 'Q', 'n', 'T', 'Tj', 'ra_norot', \
+        'dec_norot', 'azimuth_apparent_norot', 'elevation_apparent_norot', 'v_init_norot', 'v_avg_norot']
 
-    out_str =  ""
-    out_str += "# Summary generated on {:s} UTC\n\r".format(str(datetime.datetime.utcnow()))
+    traj_attrs = ['jdt_ref', 'rbeg_lat', 'rbeg_lon', 'rbeg_ele', 'rend_lat', 'rend_lon', 'rend_ele', \
+        'best_conv_inter.conv_angle']
 
-    header = ["   Beginning      ", "       Beginning          ", "  IAU", " IAU", "  Sol lon ", "  App LST ", "  RAgeo  ", "  +/-  ", "  DECgeo ", "  +/-  ", " LAMgeo  ", "  +/-  ", "  BETgeo ", "  +/-  ", "   Vgeo  ", "   +/- ", " LAMhel  ", "  +/-  ", "  BEThel ", "  +/-  ", "   Vhel  ", "   +/- ", "      a    ", "  +/-  ", "     e    ", "  +/-  ", "     i    ", "  +/-  ", "   peri   ", "   +/-  ", "   node   ", "   +/-  ", "    Pi    ", "  +/-  ", "     q    ", "  +/-  ", "     f    ", "  +/-  ", "     M    ", "  +/-  ", "      Q    ", "  +/-  ", "     n    ", "  +/-  ", "     T    ", "  +/-  ", "TisserandJ", "  +/-  ", "  RAapp  ", "  +/-  ", "  DECapp ", "  +/-  ", " Azim +E ", "  +/-  ", "   Elev  ", "  +/-  ", "  Vinit  ", "   +/- ", "   Vavg  ", "   +/- ", "   LatBeg   ", "  +/-  ", "   LonBeg   ", "  +/-  ", "  HtBeg ", "  +/-  ", "   LatEnd   ", "  +/-  ", "   LonEnd   ", "  +/-  ", "  HtEnd ", "  +/-  ", "Duration", " Peak ", " Peak Ht", " Mass kg", "  Qc ", "MedianFitErr", "Beg in", "End in", " Num", "     Participating    "]
-    head_2 = ["  Julian date     ", "        UTC Time          ", "   No", "code", "    deg   ", "    deg   ", "   deg   ", " sigma ", "   deg   ", " sigma ", "   deg   ", " sigma ", "    deg  ", " sigma ", "   km/s  ", "  sigma", "   deg   ", " sigma ", "    deg  ", " sigma ", "   km/s  ", "  sigma", "     AU    ", " sigma ", "          ", " sigma ", "   deg    ", " sigma ", "    deg   ", "  sigma ", "    deg   ", "  sigma ", "   deg    ", " sigma ", "    AU    ", " sigma ", "   deg    ", " sigma ", "    deg   ", " sigma ", "     AU    ", " sigma ", "  deg/day ", " sigma ", "   years  ", " sigma ", "          ", " sigma ", "   deg   ", " sigma ", "   deg   ", " sigma ", "of N  deg", " sigma ", "    deg  ", " sigma ", "   km/s  ", "  sigma", "   km/s  ", "  sigma", "   +N deg   ", " sigma ", "   +E deg   ", " sigma ", "    km  ", " sigma ", "   +N deg   ", " sigma ", "   +E deg   ", " sigma ", "    km  ", " sigma ", "  sec   ", "AbsMag", "    km  ", "tau=0.7%", " deg ", "   arcsec   ", "  FOV ", "  FOV ", "stat", "        stations      "]
-    out_str += "# {:s}\n\r".format(delimiter.join(header))
-    out_str += "# {:s}\n\r".format(delimiter.join(head_2))
+    uncer_attrs = ['ra_g', 'dec_g', 'L_g', 'B_g', 'v_g', 'L_h', 'B_h', 'v_h', 'a', 'e', 'i', 'peri', 'node', \
+        'pi', 'q', 'true_anomaly', 'mean_anomaly', 'Q', 'n', 'T', 'Tj', 'ra_norot', 'dec_norot', \
+        'azimuth_apparent', 'elevation_apparent', 'v_init', 'v_avg', 'rbeg_lat', 'rbeg_lon', 'rbeg_ele', \
+        'rend_lat', 'rend_lon', 'rend_ele']
 
-    # Add a horizontal line
-    out_str += "# {:s}\n\r".format("; ".join(["-"*len(entry) for entry in header]))
+    orbit_cols = attributeColumns([traj.orbit for traj in traj_list], orbit_attrs)
+    traj_cols = attributeColumns(traj_list, traj_attrs)
 
-    # Write lines of data
-    for traj in traj_list:
+    # Missing uncertainties are read as None (also when traj.uncertainties is None), which numpy converts to 
+    #   NaN. They are masked, so they can be told apart from uncertainties which were computed as NaN
+    uncer_arr = np.array([[getattr(traj.uncertainties, name, None) for name in uncer_attrs] \
+        for traj in traj_list], dtype=np.float64).reshape(len(traj_list), len(uncer_attrs))
 
-        line_info = []
+    uncer_missing = np.array([[not hasattr(traj.uncertainties, name) for name in uncer_attrs] \
+        for traj in traj_list], dtype=bool).reshape(len(traj_list), len(uncer_attrs))
 
-        line_info.append("{:20.12f}".format(traj.jdt_ref))
-        line_info.append("{:26s}".format(str(jd2Date(traj.jdt_ref, dt_obj=True))))
+    uncer_arr = np.ma.masked_array(uncer_arr, mask=uncer_missing)
 
-        # Perform shower association
-        shower_obj = associateShowerTraj(traj)
-        if shower_obj is None:
-            shower_no = -1
-            shower_code = '...'
-        else:
-            shower_no = shower_obj.IAU_no
-            shower_code = shower_obj.IAU_code
+    uncer_cols = dict(zip(uncer_attrs, uncer_arr.T))
 
-        line_info.append("{:>5d}".format(shower_no))
-        line_info.append("{:>4s}".format(shower_code))
-
-
-        # Geocentric radiant (equatorial and ecliptic)
-        line_info.append("{:>10.6f}".format(np.degrees(traj.orbit.la_sun)))
-        line_info.append("{:>10.6f}".format(np.degrees(traj.orbit.lst_ref)))
-        line_info.append("{:>9.5f}".format(np.degrees(traj.orbit.ra_g)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'ra_g', deg=True, max_val=100.0)))
-        line_info.append("{:>+9.5f}".format(np.degrees(traj.orbit.dec_g)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'dec_g', deg=True, max_val=100.0)))
-        line_info.append("{:>9.5f}".format(np.degrees(traj.orbit.L_g)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'L_g', deg=True, max_val=100.0)))
-        line_info.append("{:>+9.5f}".format(np.degrees(traj.orbit.B_g)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'B_g', deg=True, max_val=100.0)))
-        line_info.append("{:>9.5f}".format(traj.orbit.v_g/1000))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'v_g', multi=1.0/1000)))
-
-        # Ecliptic heliocentric radiant
-        line_info.append("{:>9.5f}".format(np.degrees(traj.orbit.L_h)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'L_h', deg=True, max_val=100.0)))
-        line_info.append("{:>+9.5f}".format(np.degrees(traj.orbit.B_h)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'B_h', deg=True, max_val=100.0)))
-        line_info.append("{:>9.5f}".format(traj.orbit.v_h/1000))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'v_h', multi=1.0/1000)))
-
-        # Orbital elements
-        if abs(traj.orbit.a) < 1000:
-            line_info.append("{:>11.6f}".format(traj.orbit.a))
-        else:
-            line_info.append("{:>11.2e}".format(traj.orbit.a))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'a', max_val=100.0)))
-        line_info.append("{:>10.6f}".format(traj.orbit.e))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'e')))
-        line_info.append("{:>10.6f}".format(np.degrees(traj.orbit.i)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'i', deg=True)))
-        line_info.append("{:>10.6f}".format(np.degrees(traj.orbit.peri)))
-        line_info.append("{:>8s}".format(_uncer(traj, '{:.4f}', 'peri', deg=True)))
-        line_info.append("{:>10.6f}".format(np.degrees(traj.orbit.node)))
-        line_info.append("{:>8s}".format(_uncer(traj, '{:.4f}', 'node', deg=True)))
-        line_info.append("{:>10.6f}".format(np.degrees(traj.orbit.pi)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'pi', deg=True)))
-        line_info.append("{:>10.6f}".format(traj.orbit.q))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'q')))
-        line_info.append("{:>10.6f}".format(np.degrees(traj.orbit.true_anomaly)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'true_anomaly', deg=True)))
-        line_info.append("{:>10.6f}".format(np.degrees(traj.orbit.mean_anomaly)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'mean_anomaly', deg=True)))
-        if abs(traj.orbit.Q) < 1000:
-            line_info.append("{:>11.6f}".format(traj.orbit.Q))
-        else:
-            line_info.append("{:>11.4e}".format(traj.orbit.Q))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'Q', max_val=100.0)))
-        line_info.append("{:>10.6f}".format(np.degrees(traj.orbit.n)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'n', deg=True, max_val=100.0)))
-        if traj.orbit.T < 1000:
-            line_info.append("{:>10.6f}".format(traj.orbit.T))
-        else:
-            line_info.append("{:>10.4e}".format(traj.orbit.T))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'T', max_val=100.0)))
-        line_info.append("{:>10.6f}".format(traj.orbit.Tj))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'Tj', max_val=100.0)))
-        
-        # Apparent radiant
-        line_info.append("{:>9.5f}".format(np.degrees(traj.orbit.ra_norot)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'ra_norot', deg=True, max_val=100.0)))
-        line_info.append("{:>+9.5f}".format(np.degrees(traj.orbit.dec_norot)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'dec_norot', deg=True, max_val=100.0)))
-        line_info.append("{:>9.5f}".format(np.degrees(traj.orbit.azimuth_apparent_norot)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'azimuth_apparent', deg=True, max_val=100.0)))
-        line_info.append("{:>9.5f}".format(np.degrees(traj.orbit.elevation_apparent_norot)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'elevation_apparent', deg=True, max_val=100.0)))
-        line_info.append("{:>9.5f}".format(traj.orbit.v_init_norot/1000))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'v_init', multi=1.0/1000)))
-        line_info.append("{:>9.5f}".format(traj.orbit.v_avg_norot/1000))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:7.4f}', 'v_avg', multi=1.0/1000)))
-
-        # Begin/end point
-        line_info.append("{:>12.6f}".format(np.degrees(traj.rbeg_lat)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'rbeg_lat', deg=True)))
-        line_info.append("{:>12.6f}".format(np.degrees(traj.rbeg_lon)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'rbeg_lon', deg=True)))
-        line_info.append("{:>8.4f}".format(traj.rbeg_ele/1000))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.2f}', 'rbeg_ele', multi=1.0/1000)))
-        line_info.append("{:>12.6f}".format(np.degrees(traj.rend_lat)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'rend_lat', deg=True)))
-        line_info.append("{:>12.6f}".format(np.degrees(traj.rend_lon)))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.4f}', 'rend_lon', deg=True)))
-        line_info.append("{:>8.4f}".format(traj.rend_ele/1000))
-        line_info.append("{:>7s}".format(_uncer(traj, '{:.2f}', 'rend_ele', multi=1.0/1000)))
+    return orbit_cols, traj_cols, uncer_cols
 
-        
-        
-        # Compute the duration
-        duration = max([np.max(obs.time_data[obs.ignore_list == 0]) for obs in traj.observations \
-            if obs.ignore_station == False])
 
-        # Compute the peak magnitude and the peak height
-        peak_mags = [np.min(obs.absolute_magnitudes[obs.ignore_list == 0]) for obs in traj.observations \
-            if obs.ignore_station == False]
-        peak_mag = np.min(peak_mags)
-        peak_ht = [obs.model_ht[np.argmin(obs.absolute_magnitudes[obs.ignore_list == 0])] for obs in traj.observations \
-            if obs.ignore_station == False][np.argmin(peak_mags)]
 
+def associateShowers(traj_list):
+    """ Associate all trajectories to meteor showers, so the association can be shared between the summary 
+        file and the plots.
 
-        ### Compute the mass
+    Arguments:
+        traj_list: [list] A list of Trajectory objects.
 
-        time_mag_arr = []
-        avg_t_diff_max = 0
-        for obs in traj.observations:
+    Return:
+        [dict] MeteorShower objects (None for sporadics), keyed by the id() of the trajectory object.
+    """
 
-            # Skip ignored stations
-            if obs.ignore_station:
-                continue
+    return {id(traj): associateShowerTraj(traj) for traj in traj_list}
 
-            # If there are not magnitudes for this site, skip it
-            if obs.absolute_magnitudes is None:
-                continue
 
-            # Compute average time difference
-            avg_t_diff_max = max(avg_t_diff_max, np.median(obs.time_data[1:] - obs.time_data[:-1]))
 
-            for t, mag in zip(obs.time_data, obs.absolute_magnitudes):
-                if (mag is not None) and (not np.isnan(mag)):
-                    time_mag_arr.append([t, mag])
+def findTrajectoryFiles(dir_path):
+    """ Find all trajectory pickle files in the given directory and all its subdirectories. The directories 
+        are listed with os.scandir, so files are filtered by name without any additional stat calls. The 
+        directories are visited in the same order as with os.walk.
 
+    Arguments:
+        dir_path: [str] Path to the data directory.
+
+    Return:
+        [generator] Yields (dir_path, file_name) tuples of all found trajectory pickle files.
+    """
+
+    dir_stack = [dir_path]
+    while dir_stack:
+
+        dir_path = dir_stack.pop()
+
+        subdir_paths = []
+        file_names = []
+
+        # Skip directories which cannot be read, as os.walk does
+        try:
+            with os.scandir(dir_path) as dir_entries:
+                for entry in dir_entries:
+
+                    # Symbolic links to directories are not followed
+                    if entry.is_dir(follow_symlinks=False):
+                        subdir_paths.append(entry.path)
+
+                    elif entry.name.endswith("_trajectory.pickle"):
+                        file_names.append(entry.name)
+
+        except OSError:
+            continue
+
+
+        for file_name in file_names:
+            yield dir_path, file_name
+
+        # Visit the subdirectories in the order in which they were listed
+        dir_stack.extend(reversed(subdir_paths))
+
+
+
+def trajectoryFilterMask(traj_list, min_traj_points=6, min_qc=5.0, max_e=1.5, max_radiant_err=2.0, \
+    max_vg_err=10.0, max_begin_ht=160, min_end_ht=20):
+    """ Check the trajectories against the quality filters. The filtered values of all trajectories are read
+        into arrays first, so the filters are applied to all trajectories at once. All trajectories have to
+        have an orbit solution.
+
+    Arguments:
+        traj_list: [list] A list of Trajectory objects.
+
+    Keyword arguments:
+        min_traj_points: [int] Minimum number of points on the trajectory for the station with the most
+            points.
+        min_qc: [float] Minimum convergence angle (deg).
+        max_e: [float] Maximum eccentricity.
+        max_radiant_err: [float] Maximum radiant error (deg).
+        max_vg_err: [float] Maximum geocentric velocity error (percent).
+        max_begin_ht: [float] Maximum begin height (km).
+        min_end_ht: [float] Minimum end height (km).
+
+    Return:
+        [ndarray] Boolean mask, True for trajectories which passed the filters.
+    """
+
+    # Read the filtered values of all trajectories
+    cols = attributeColumns(traj_list, ['best_conv_inter.conv_angle', 'orbit.e', 'orbit.v_g', 'rbeg_ele', \
+        'rend_ele'])
+
+    # Missing uncertainties are read as NaN, which pass the uncertainty filters
+    uncer_arr = np.array([[getattr(traj.uncertainties, name, None) for name in ['ra_g', 'dec_g', 'v_g']] \
+        for traj in traj_list], dtype=np.float64).reshape(len(traj_list), 3)
+
+    # Number of used points of the station with the most points, -1 if all stations are ignored
+    max_points = np.array([max([np.count_nonzero(obs.ignore_list == 0) for obs in traj.observations \
+        if obs.ignore_station == False], default=-1) for traj in traj_list], dtype=np.int64)
+
+
+    # The filters are given as rejection conditions negated, so NaN values pass them
+
+    ### MINIMUM POINTS
+    ### Reject all trajectories with small number of used points ###
+    mask = max_points >= 0
+    mask &= ~(max_points < min_traj_points)
+
+    ### CONVERGENCE ANGLE
+    ### Reject all trajectories with a too small convergence angle ###
+    mask &= ~(cols['best_conv_inter.conv_angle']*RAD2DEG < min_qc)
+
+    ### MAXIMUM ECCENTRICITY ###
+    mask &= ~(cols['orbit.e'] > max_e)
+
+    ### MAXIMUM RADIANT ERROR ###
+    mask &= ~(np.hypot(uncer_arr[:, 0], uncer_arr[:, 1])*RAD2DEG > max_radiant_err)
+
+    ### MAXIMUM GEOCENTRIC VELOCITY ERROR ###
+    mask &= ~(uncer_arr[:, 2] > cols['orbit.v_g']*max_vg_err/100)
+
+    ### HEIGHT FILTER ###
+    mask &= ~(cols['rbeg_ele']/1000 > max_begin_ht)
+    mask &= ~(cols['rend_ele']/1000 < min_end_ht)
+
+
+    return mask
 
-        # Compute the mass
-        time_mag_arr = np.array(sorted(time_mag_arr, key=lambda x: x[0]))
-        time_arr, mag_arr = time_mag_arr.T
-        
-        # Average out the magnitudes
-        time_arr, mag_arr = averageClosePoints(time_arr, mag_arr, avg_t_diff_max)
 
-        # Compute the photometry mass
-        mass = calcMass(np.array(time_arr), np.array(mag_arr), traj.orbit.v_avg_norot, P_0m=P_0m)
 
-        ###
+def loadFilteredTrajectories(traj_paths, **filter_kwargs):
+    """ Load trajectory pickle files and check them against the quality filters. This function is run in
+        worker processes when trajectories are loaded in parallel, so only trajectories which pass the
+        filters are sent back to the main process.
 
+    Arguments:
+        traj_paths: [list] Paths to trajectory pickle files.
 
-        # Meteor parameters (duration, peak magnitude, integrated intensity, Q angle)
-        line_info.append("{:8.2f}".format(duration))
-        line_info.append("{:+6.2f}".format(peak_mag))
-        line_info.append("{:>8.4f}".format(peak_ht/1000))
-        line_info.append("{:8.2e}".format(mass))
+    Keyword arguments:
+        **filter_kwargs: Quality filters, passed to trajectoryFilterMask.
 
-        # Convergence angle
-        line_info.append("{:5.2f}".format(np.degrees(traj.best_conv_inter.conv_angle)))
+    Return:
+        [list] Loaded trajectories which passed the filters.
+    """
 
-        # Median fit error in arcsec
-        line_info.append("{:12.2f}".format(3600*np.degrees(np.median([obs.ang_res_std for obs \
-            in traj.observations if not obs.ignore_station]))))
+    traj_list = []
+    for traj_path in traj_paths:
+
+        # Load the pickle file
+        traj = loadPickle(*os.path.split(traj_path))
+
+        # Skip those with no orbit solution
+        if traj.orbit.ra_g is None:
+            continue
+
+        traj_list.append(traj)
+
+
+    mask = trajectoryFilterMask(traj_list, **filter_kwargs)
+
+    return [traj for traj, passed in zip(traj_list, mask) if passed]
+
+
+
+# Light curve summary of a trajectory, see summarizeObservations
+ObservationSummary = collections.namedtuple('ObservationSummary', \
+    ['duration', 'peak_mag', 'peak_ht', 't_all', 'm_all', 'avg_t_diff_max'])
+
+
+def summarizeObservations(traj):
+    """ Compute the duration, the peak magnitude and the light curve points of the trajectory in a single
+        walk over its observations. Ignored stations are skipped.
+
+    Arguments:
+        traj: [Trajectory] Trajectory object.
+
+    Return:
+        [ObservationSummary] Named tuple with the fields:
+            - duration: [float] Duration of the meteor (s).
+            - peak_mag: [float] Peak absolute magnitude.
+            - peak_ht: [float] Height at the point of the peak magnitude (m).
+            - t_all: [ndarray] Times of all points with a magnitude (s).
+            - m_all: [ndarray] Absolute magnitudes of all points with a magnitude.
+            - avg_t_diff_max: [float] The largest median time difference between points of a station (s).
+    """
+
+    time_used_parts = []
+    mag_used_parts = []
+    ht_used_parts = []
+
+    time_parts = []
+    mag_parts = []
+    avg_t_diff_max = 0
+
+    for obs in traj.observations:
+
+        # Skip ignored stations
+        if obs.ignore_station:
+            continue
+
+        # Indices of points used in the solution. The mask is converted to indices only once, instead of
+        #   being evaluated again for every array it is applied to
+        used_idx = np.flatnonzero(obs.ignore_list == 0)
+        time_used_parts.append(obs.time_data[used_idx])
+        mag_used_parts.append(obs.absolute_magnitudes[used_idx])
+        ht_used_parts.append(obs.model_ht[used_idx])
+
+
+        # If there are not magnitudes for this site, it is not used for the mass
+        if obs.absolute_magnitudes is None:
+            continue
+
+        # Compute average time difference
+        avg_t_diff_max = max(avg_t_diff_max, np.median(obs.time_data[1:] - obs.time_data[:-1]))
+
+        # Convert the magnitudes to a float array once (missing magnitudes given as None become NaN),
+        #   then take only points with a magnitude
+        mag_data = np.asarray(obs.absolute_magnitudes, dtype=np.float64)
+        mag_mask = ~np.isnan(mag_data)
+        time_parts.append(obs.time_data[mag_mask])
+        mag_parts.append(mag_data[mag_mask])
+
+
+    # Compute the duration
+    duration = np.max(np.concatenate(time_used_parts))
+
+    # Compute the peak magnitude and the peak height at the point of the peak magnitude
+    mag_used = np.concatenate(mag_used_parts)
+    peak_idx = np.argmin(mag_used)
+    peak_mag = mag_used[peak_idx]
+    peak_ht = np.concatenate(ht_used_parts)[peak_idx]
+
+
+    return ObservationSummary(duration, peak_mag, peak_ht, np.concatenate(time_parts), \
+        np.concatenate(mag_parts), avg_t_diff_max)
+
+
+
+def formatUncertainties(uncer_cols, std_name, str_format, multi=1.0, deg=False, max_val=None, \
+    max_val_format="%7.1e"):
+    """ Returns the formatted uncertanties of all trajectories. If the uncertanty is not given, 'None' is
+        returned for that trajectory. Uncertanties which are given as NaN are formatted as 'nan'.
+
+    Arguments:
+        uncer_cols: [dict] Uncertainty columns of all trajectories, as returned by summaryColumns.
+        std_name: [str] Name of the uncertanty attribute, e.g. if it is 'x', then the uncertanty is
+            stored in uncertainties.x.
+        str_format: [str] String format for the unceertanty, including the width of the column.
+
+    Keyword arguments:
+        multi: [float] Uncertanty multiplier. 1.0 by default. This is used to scale the uncertanty to
+            different units (e.g. from m/s to km/s).
+        deg: [bool] Converet radians to degrees if True. False by defualt.
+        max_val: [float] Larger number to use the given format. If the value is larger than that, the
+            max_val_format is used.
+        max_val_format: [str]
+
+    Return:
+        [ndarray] An array of formatted uncertanties.
+    """
+
+    if deg:
+        multi *= RAD2DEG
+
+    # Get the values
+    uncer_col = uncer_cols[std_name]
+    val = uncer_col.data*multi
+
+    str_arr = np.char.mod(str_format, val)
+
+    # If the value is too big, use scientific notation
+    if max_val is not None:
+        str_arr = np.where(val > max_val, np.char.mod(max_val_format, val), str_arr)
+
+    # Mark missing uncertanties, aligned to the width of the column
+    return np.where(np.ma.getmaskarray(uncer_col), _missingValueStr(str_format), str_arr)
+
+
+
+@functools.lru_cache(maxsize=None)
+def _missingValueStr(str_format):
+    """ Return the 'None' string aligned to the width of the column with the given format. """
+
+    return "None".rjust(len(str_format % 0))
+
+
+
+def formatLargeValues(arr, str_format, max_val_format, max_val=1000):
+    """ Format the values, using the scientific notation for values whose absolute value is larger than
+        max_val.
+    """
+
+    return np.where(np.abs(arr) < max_val, np.char.mod(str_format, arr), np.char.mod(max_val_format, arr))
+
+
+
+def writeOrbitSummaryFile(dir_path, traj_list, P_0m=1210, shower_dict=None):
+    """ Given a list of trajectory files, generate CSV file with the orbit summary. 
+    
+    Arguments:
+        dir_path: [str] Path to the directory where the summary file will be saved.
+        traj_list: [list] A list of Trajectory objects.
+
+    Keyword arguments:
+        P_0m: [float] Power output of a zero absolute magnitude meteor, used for computing the mass.
+        shower_dict: [dict] Shower associations returned by associateShowers. If not given, the 
+            trajectories will be associated here.
+    """
+
+    # Sort trajectories by Julian date
+    traj_list = sorted(traj_list, key=lambda x: x.jdt_ref)
+
+    # Perform shower association
+    if shower_dict is None:
+        shower_dict = associateShowers(traj_list)
+
+    # Extract the values of all trajectories into arrays
+    orbit_cols, traj_cols, uncer_cols = summaryColumns(traj_list)
+
+
+    # Convert the reference Julian dates of all trajectories to dates at once
+    date_list = ["{:26s}".format(str(date)) for date in jd2Date_vect(traj_cols['jdt_ref'])]
+
+
+    # Compute values which have to be computed separately for every trajectory
+    shower_no_list = []
+    shower_code_list = []
+    duration_list = []
+    peak_mag_list = []
+    peak_ht_list = []
+    mass_list = []
+    fit_err_list = []
+    fov_beg_str_list = []
+    fov_end_str_list = []
+    num_stations_list = []
+    stations_str_list = []
+    for traj in traj_list:
+
+        shower_obj = shower_dict[id(traj)]
+        if shower_obj is None:
+            shower_no = -1
+            shower_code = '...'
+        else:
+            shower_no = shower_obj.IAU_no
+            shower_code = shower_obj.IAU_code
+
+        shower_no_list.append("{:>5d}".format(shower_no))
+        shower_code_list.append("{:>4s}".format(shower_code))
+
+        
+        
+        # Compute the duration, the peak magnitude and height, and collect the light curve points, all in
+        #   a single walk over the observations
+        obs_summary = summarizeObservations(traj)
+
+        # Compute the photometry mass from the points of all stations. The points are sorted by time and
+        #   close points are averaged before the light curve is integrated
+        mass = calcMassLightCurve(obs_summary.t_all, obs_summary.m_all, obs_summary.avg_t_diff_max, \
+            traj.orbit.v_avg_norot, P_0m=P_0m)
+
+
+        duration_list.append(obs_summary.duration)
+        peak_mag_list.append(obs_summary.peak_mag)
+        peak_ht_list.append(obs_summary.peak_ht)
+        mass_list.append(mass)
+
+
+        # Median fit error
+        fit_err_list.append(np.median([obs.ang_res_std for obs in traj.observations \
+            if not obs.ignore_station]))
 
 
         # Meteor begins inside the FOV
@@ -275,7 +506,7 @@ def writeOrbitSummaryFile(dir_path, traj_list, P_0m=1210):
         if len(fov_beg_list) > 0:
             fov_beg = np.any(fov_beg_list)
 
-        line_info.append("{:>6s}".format(str(fov_beg)))
+        fov_beg_str_list.append("{:>6s}".format(str(fov_beg)))
 
         # Meteor ends inside the FOV
         fov_end = None
@@ -284,23 +515,143 @@ def writeOrbitSummaryFile(dir_path, traj_list, P_0m=1210):
         if len(fov_end_list) > 0:
             fov_end = np.any(fov_end_list)
 
-        line_info.append("{:>6s}".format(str(fov_end)))
+        fov_end_str_list.append("{:>6s}".format(str(fov_end)))
 
 
         # Participating stations
         participating_stations = sorted([obs.station_id for obs in traj.observations \
             if obs.ignore_station == False])
-        line_info.append("{:>4d}".format(len(participating_stations)))
-        line_info.append("{:s}".format(",".join(participating_stations)))
-
+        num_stations_list.append("{:>4d}".format(len(participating_stations)))
+        stations_str_list.append("{:s}".format(",".join(participating_stations)))
+
+
+
+    ### Format all columns at once ###
+
+    columns = []
+
+    columns.append(np.char.mod("%20.12f", traj_cols['jdt_ref']))
+    columns.append(date_list)
+    columns.append(shower_no_list)
+    columns.append(shower_code_list)
+
+    # Geocentric radiant (equatorial and ecliptic)
+    columns.append(np.char.mod("%10.6f", np.degrees(orbit_cols['la_sun'])))
+    columns.append(np.char.mod("%10.6f", np.degrees(orbit_cols['lst_ref'])))
+    columns.append(np.char.mod("%9.5f", np.degrees(orbit_cols['ra_g'])))
+    columns.append(formatUncertainties(uncer_cols, 'ra_g', '%7.4f', deg=True, max_val=100.0))
+    columns.append(np.char.mod("%+9.5f", np.degrees(orbit_cols['dec_g'])))
+    columns.append(formatUncertainties(uncer_cols, 'dec_g', '%7.4f', deg=True, max_val=100.0))
+    columns.append(np.char.mod("%9.5f", np.degrees(orbit_cols['L_g'])))
+    columns.append(formatUncertainties(uncer_cols, 'L_g', '%7.4f', deg=True, max_val=100.0))
+    columns.append(np.char.mod("%+9.5f", np.degrees(orbit_cols['B_g'])))
+    columns.append(formatUncertainties(uncer_cols, 'B_g', '%7.4f', deg=True, max_val=100.0))
+    columns.append(np.char.mod("%9.5f", orbit_cols['v_g']/1000))
+    columns.append(formatUncertainties(uncer_cols, 'v_g', '%7.4f', multi=1.0/1000))
+
+    # Ecliptic heliocentric radiant
+    columns.append(np.char.mod("%9.5f", np.degrees(orbit_cols['L_h'])))
+    columns.append(formatUncertainties(uncer_cols, 'L_h', '%7.4f', deg=True, max_val=100.0))
+    columns.append(np.char.mod("%+9.5f", np.degrees(orbit_cols['B_h'])))
+    columns.append(formatUncertainties(uncer_cols, 'B_h', '%7.4f', deg=True, max_val=100.0))
+    columns.append(np.char.mod("%9.5f", orbit_cols['v_h']/1000))
+    columns.append(formatUncertainties(uncer_cols, 'v_h', '%7.4f', multi=1.0/1000))
+
+    # Orbital elements
+    columns.append(formatLargeValues(orbit_cols['a'], "%11.6f", "%11.2e"))
+    columns.append(formatUncertainties(uncer_cols, 'a', '%7.4f', max_val=100.0))
+    columns.append(np.char.mod("%10.6f", orbit_cols['e']))
+    columns.append(formatUncertainties(uncer_cols, 'e', '%7.4f'))
+    columns.append(np.char.mod("%10.6f", np.degrees(orbit_cols['i'])))
+    columns.append(formatUncertainties(uncer_cols, 'i', '%7.4f', deg=True))
+    columns.append(np.char.mod("%10.6f", np.degrees(orbit_cols['peri'])))
+    columns.append(formatUncertainties(uncer_cols, 'peri', '%8.4f', deg=True))
+    columns.append(np.char.mod("%10.6f", np.degrees(orbit_cols['node'])))
+    columns.append(formatUncertainties(uncer_cols, 'node', '%8.4f', deg=True))
+    columns.append(np.char.mod("%10.6f", np.degrees(orbit_cols['pi'])))
+    columns.append(formatUncertainties(uncer_cols, 'pi', '%7.4f', deg=True))
+    columns.append(np.char.mod("%10.6f", orbit_cols['q']))
+    columns.append(formatUncertainties(uncer_cols, 'q', '%7.4f'))
+    columns.append(np.char.mod("%10.6f", np.degrees(orbit_cols['true_anomaly'])))
+    columns.append(formatUncertainties(uncer_cols, 'true_anomaly', '%7.4f', deg=True))
+    columns.append(np.char.mod("%10.6f", np.degrees(orbit_cols['mean_anomaly'])))
+    columns.append(formatUncertainties(uncer_cols, 'mean_anomaly', '%7.4f', deg=True))
+    columns.append(formatLargeValues(orbit_cols['Q'], "%11.6f", "%11.4e"))
+    columns.append(formatUncertainties(uncer_cols, 'Q', '%7.4f', max_val=100.0))
+    columns.append(np.char.mod("%10.6f", np.degrees(orbit_cols['n'])))
+    columns.append(formatUncertainties(uncer_cols, 'n', '%7.4f', deg=True, max_val=100.0))
+
+    # Unlike a and Q, the period is not compared in absolute value
+    orbit_T = orbit_cols['T']
+    columns.append(np.where(orbit_T < 1000, np.char.mod("%10.6f", orbit_T), np.char.mod("%10.4e", orbit_T)))
+    columns.append(formatUncertainties(uncer_cols, 'T', '%7.4f', max_val=100.0))
+    columns.append(np.char.mod("%10.6f", orbit_cols['Tj']))
+    columns.append(formatUncertainties(uncer_cols, 'Tj', '%7.4f', max_val=100.0))
+    
+    # Apparent radiant
+    columns.append(np.char.mod("%9.5f", np.degrees(orbit_cols['ra_norot'])))
+    columns.append(formatUncertainties(uncer_cols, 'ra_norot', '%7.4f', deg=True, max_val=100.0))
+    columns.append(np.char.mod("%+9.5f", np.degrees(orbit_cols['dec_norot'])))
+    columns.append(formatUncertainties(uncer_cols, 'dec_norot', '%7.4f', deg=True, max_val=100.0))
+    columns.append(np.char.mod("%9.5f", np.degrees(orbit_cols['azimuth_apparent_norot'])))
+    columns.append(formatUncertainties(uncer_cols, 'azimuth_apparent', '%7.4f', deg=True, max_val=100.0))
+    columns.append(np.char.mod("%9.5f", np.degrees(orbit_cols['elevation_apparent_norot'])))
+    columns.append(formatUncertainties(uncer_cols, 'elevation_apparent', '%7.4f', deg=True, max_val=100.0))
+    columns.append(np.char.mod("%9.5f", orbit_cols['v_init_norot']/1000))
+    columns.append(formatUncertainties(uncer_cols, 'v_init', '%7.4f', multi=1.0/1000))
+    columns.append(np.char.mod("%9.5f", orbit_cols['v_avg_norot']/1000))
+    columns.append(formatUncertainties(uncer_cols, 'v_avg', '%7.4f', multi=1.0/1000))
+
+    # Begin/end point
+    columns.append(np.char.mod("%12.6f", np.degrees(traj_cols['rbeg_lat'])))
+    columns.append(formatUncertainties(uncer_cols, 'rbeg_lat', '%7.4f', deg=True))
+    columns.append(np.char.mod("%12.6f", np.degrees(traj_cols['rbeg_lon'])))
+    columns.append(formatUncertainties(uncer_cols, 'rbeg_lon', '%7.4f', deg=True))
+    columns.append(np.char.mod("%8.4f", traj_cols['rbeg_ele']/1000))
+    columns.append(formatUncertainties(uncer_cols, 'rbeg_ele', '%7.2f', multi=1.0/1000))
+    columns.append(np.char.mod("%12.6f", np.degrees(traj_cols['rend_lat'])))
+    columns.append(formatUncertainties(uncer_cols, 'rend_lat', '%7.4f', deg=True))
+    columns.append(np.char.mod("%12.6f", np.degrees(traj_cols['rend_lon'])))
+    columns.append(formatUncertainties(uncer_cols, 'rend_lon', '%7.4f', deg=True))
+    columns.append(np.char.mod("%8.4f", traj_cols['rend_ele']/1000))
+    columns.append(formatUncertainties(uncer_cols, 'rend_ele', '%7.2f', multi=1.0/1000))
+
+    # Meteor parameters (duration, peak magnitude, integrated intensity, Q angle)
+    columns.append(np.char.mod("%8.2f", np.array(duration_list, dtype=np.float64)))
+    columns.append(np.char.mod("%+6.2f", np.array(peak_mag_list, dtype=np.float64)))
+    columns.append(np.char.mod("%8.4f", np.array(peak_ht_list, dtype=np.float64)/1000))
+    columns.append(np.char.mod("%8.2e", np.array(mass_list, dtype=np.float64)))
+
+    # Convergence angle
+    columns.append(np.char.mod("%5.2f", np.degrees(traj_cols['best_conv_inter.conv_angle'])))
+
+    # Median fit error in arcsec
+    columns.append(np.char.mod("%12.2f", 3600*np.degrees(np.array(fit_err_list, dtype=np.float64))))
+
+    # Meteor begins/ends inside the FOV
+    columns.append(fov_beg_str_list)
+    columns.append(fov_end_str_list)
+
+    # Participating stations
+    columns.append(num_stations_list)
+    columns.append(stations_str_list)
 
-        out_str += delimiter.join(line_info) + "\n\r"
+    ### ###
 
 
-    # Save the file to a trajectory summary
+    # Save the file to a trajectory summary. The lines are written to the file as they are joined, instead of 
+    #   first accumulating the whole file in one string
     traj_summary_path = os.path.join(dir_path, TRAJ_SUMMARY_FILE)
-    with open(traj_summary_path, 'w') as f:
-        f.write(out_str)
+    with open(traj_summary_path, 'w', buffering=1024**2) as f:
+
+        f.write("# Summary generated on {:s} UTC\n\r".format(str(datetime.datetime.utcnow())))
+
+        f.write(SUMMARY_HEADER_LINES)
+
+        # Write lines of data
+        for line_info in zip(*columns):
+            f.write(SUMMARY_DELIMITER.join(line_info))
+            f.write("\n\r")
 
     print("Trajectory summary saved to:", traj_summary_path)
 
@@ -313,6 +664,10 @@ def plotSCE(x_data, y_data, color_data, sol_range, plot_title, colorbar_title, d
 
     ### PLOT SUN-CENTERED GEOCENTRIC ECLIPTIC RADIANTS ###
 
+    # Convert the coordinates to arrays only once
+    x_data = np.asarray(x_data, dtype=np.float64)
+    y_data = np.asarray(y_data, dtype=np.float64)
+
     fig = plt.figure(figsize=(16, 8), facecolor='k')
 
 
@@ -362,23 +717,28 @@ def plotSCE(x_data, y_data, color_data, sol_range, plot_title, colorbar_title, d
         lon_bins = np.linspace(lon_min, lon_max, int(360/delta_deg))
         lat_bins = np.linspace(lat_min, lat_max, int(180/delta_deg))
 
-        # Rotate all coordinates by 90 deg to make them Sun-centered
-        x_data = np.array(x_data)
-        y_data = np.array(y_data)
-        lon_corr = (np.degrees(x_data) + 90)%360
+        # Rotate all coordinates by 90 deg to make them Sun-centered (computed in place, so no temporary
+        #   arrays are allocated)
+        lon_corr = np.degrees(x_data)
+        lon_corr += 90
+        np.remainder(lon_corr, 360, out=lon_corr)
 
-        # Do a sinus projection
-        lon_corr_temp = np.zeros_like(lon_corr)
-        lon_corr_temp[lon_corr > 180] = ((180 - lon_corr[lon_corr > 180] + 180)*np.cos(y_data[lon_corr > 180]))
-        lon_corr_temp[lon_corr <= 180] = ((180 - lon_corr[lon_corr <= 180] - 180)*np.cos(y_data[lon_corr <= 180]))
-        lon_corr = lon_corr_temp
+        # Do a sinus projection (the longitudes are wrapped to the [-180, 180] range and mirrored)
+        lon_corr[lon_corr > 180] -= 360
+        np.negative(lon_corr, out=lon_corr)
+        lon_corr *= np.cos(y_data)
 
         # Compute the histogram
-        data, _, _ = np.histogram2d(lon_corr, 
-            np.degrees(np.array(y_data)), bins=(lon_bins, lat_bins))
+        data, _, _ = np.histogram2d(lon_corr, np.degrees(y_data), bins=(lon_bins, lat_bins))
 
-        # Apply Gaussian filter to it
-        data = scipy.ndimage.filters.gaussian_filter(data, 1.0)*4*np.pi
+        # The histogram is only used for plotting, so single precision is sufficient
+        data = data.astype(np.float32)
+
+        # Apply Gaussian filter to it. The filter is separable, so it is applied as two 1D filters along
+        #   each axis, in place
+        scipy.ndimage.gaussian_filter1d(data, 1.0, axis=0, output=data)
+        scipy.ndimage.gaussian_filter1d(data, 1.0, axis=1, output=data)
+        data *= 4*np.pi
 
         plt_handle = celes_plot.m.imshow(data.T, origin='lower', extent=[lon_min, lon_max, lat_min, lat_max],\
             #interpolation='gaussian', norm=matplotlib.colors.PowerNorm(gamma=1./2.), cmap=cmap)
@@ -501,98 +861,136 @@ def plotSCE(x_data, y_data, color_data, sol_range, plot_title, colorbar_title, d
 
 
 def generateTrajectoryPlots(dir_path, traj_list, plot_name='scecliptic', plot_vg=True, plot_sol=True, \
-    plot_density=True, plot_showers=False):
-    """ Given a path with trajectory .pickle files, generate orbits plots. """
+    plot_density=True, plot_showers=False, shower_dict=None):
+    """ Given a path with trajectory .pickle files, generate orbits plots. 
+    
+    If plot_showers is True, the shower associations can be given in shower_dict (as returned by 
+    associateShowers), otherwise the trajectories are associated here.
+    """
 
+    # Extract the orbits of all trajectories into arrays
+    cols = attributeColumns(traj_list, TRAJ_PLOT_ATTRS)
 
 
-    ### Plot Sun-centered geocentric ecliptic plots ###
+    # Collect the showers associated with all trajectories (hyperbolic orbits are not associated)
+    shower_list = None
+    if plot_showers:
 
-    lambda_list = []
-    beta_list = []
-    vg_list = []
-    sol_list = []
+        shower_list = []
+        for traj, e in zip(traj_list, cols['orbit.e']):
 
-    shower_no_list = []
-    shower_obj_dict = {}
+            if e > 1:
+                shower_list.append(None)
 
-    hypo_count = 0
-    jd_min = np.inf
-    jd_max = 0
-    for traj in traj_list:
+            # Perform shower association (if it wasn't done already)
+            elif shower_dict is not None:
+                shower_list.append(shower_dict[id(traj)])
 
-        # Reject all hyperbolic orbits
-        if traj.orbit.e > 1:
-            hypo_count += 1
-            continue
+            else:
+                shower_list.append(associateShowerTraj(traj))
 
-        # Compute Sun-centered longitude
-        lambda_list.append(traj.orbit.L_g - traj.orbit.la_sun)
 
-        beta_list.append(traj.orbit.B_g)
-        vg_list.append(traj.orbit.v_g/1000)
-        sol_list.append(np.degrees(traj.orbit.la_sun))
+    plotTrajectoryColumns(dir_path, cols, shower_list=shower_list, plot_name=plot_name, plot_vg=plot_vg, \
+        plot_sol=plot_sol, plot_density=plot_density, plot_showers=plot_showers)
 
-        # Track first and last observation
-        jd_min = min(jd_min, traj.jdt_ref)
-        jd_max = max(jd_max, traj.jdt_ref)
 
 
+def plotTrajectoryColumns(dir_path, cols, shower_list=None, plot_name='scecliptic', plot_vg=True, \
+    plot_sol=True, plot_density=True, plot_showers=False):
+    """ Generate orbit plots from the orbit values extracted from trajectories. The plots are made from the 
+        arrays only, so they can be sent to worker processes instead of the trajectories.
 
-        if plot_showers:
+    Arguments:
+        dir_path: [str] Path to the directory where the plots will be saved.
+        cols: [dict] Arrays of values of all trajectories, as returned by attributeColumns for 
+            TRAJ_PLOT_ATTRS.
 
-            # Perform shower association and track the list of all showers
-            shower_obj = associateShowerTraj(traj)
+    Keyword arguments:
+        shower_list: [list] MeteorShower objects (None for sporadics) of all trajectories. Only used if 
+            plot_showers is True.
+        See generateTrajectoryPlots for other arguments.
+    """
 
-            # If the trajectory was associated, sort it to the appropriate shower
-            if shower_obj is not None:
-                if shower_obj.IAU_no not in shower_no_list:
-                    shower_no_list.append(shower_obj.IAU_no)
-                    shower_obj_dict[shower_obj.IAU_no] = [shower_obj]
-                else:
-                    shower_obj_dict[shower_obj.IAU_no].append(shower_obj)
+
+
+    ### Plot Sun-centered geocentric ecliptic plots ###
+
+    # Reject all hyperbolic orbits
+    elliptic_mask = ~(cols['orbit.e'] > 1)
+    hypo_count = len(elliptic_mask) - np.count_nonzero(elliptic_mask)
+
+    la_sun = cols['orbit.la_sun'][elliptic_mask]
+
+    # Compute Sun-centered longitude
+    lambda_arr = cols['orbit.L_g'][elliptic_mask] - la_sun
+
+    beta_arr = cols['orbit.B_g'][elliptic_mask]
+    vg_arr = cols['orbit.v_g'][elliptic_mask]/1000
+    sol_arr = np.degrees(la_sun)
+
+    # Track first and last observation
+    jd_min = np.min(cols['jdt_ref'], initial=np.inf, where=elliptic_mask)
+    jd_max = np.max(cols['jdt_ref'], initial=0, where=elliptic_mask)
+
+
+
+    # Collect the showers associated with elliptic orbits
+    shower_members = []
+    if plot_showers:
+        shower_members = [shower_obj for shower_obj, elliptic in zip(shower_list, elliptic_mask) \
+            if elliptic and (shower_obj is not None)]
 
 
 
     # Compute mean shower radiant for all associated showers
     shower_obj_list = []
-    if plot_showers and shower_obj_dict:
-        for shower_no in shower_obj_dict:
+    if plot_showers and shower_members:
+
+        # Group the members by the IAU shower number
+        member_cols = attributeColumns(shower_members, ['la_sun', 'L_g', 'B_g', 'v_g'])
+        shower_nos, first_idx, group_idx, counts = np.unique([sh.IAU_no for sh in shower_members], \
+            return_index=True, return_inverse=True, return_counts=True)
+
+        # Compute the mean angles of all showers from the sums of sines and cosines (see meanAngle)
+        la_sun_means = np.arctan2(np.bincount(group_idx, weights=np.sin(member_cols['la_sun'])), \
+            np.bincount(group_idx, weights=np.cos(member_cols['la_sun'])))
+        L_g_means = np.arctan2(np.bincount(group_idx, weights=np.sin(member_cols['L_g'])), \
+            np.bincount(group_idx, weights=np.cos(member_cols['L_g'])))
+        B_g_means = np.bincount(group_idx, weights=member_cols['B_g'])/counts
+        v_g_means = np.bincount(group_idx, weights=member_cols['v_g'])/counts
+
+        # Keep the showers in the order in which they were found
+        for k in np.argsort(first_idx):
 
             # Check if there are enough shower members for plotting
-            if len(shower_obj_dict[shower_no]) < MIN_SHOWER_MEMBERS:
+            if counts[k] < MIN_SHOWER_MEMBERS:
                 continue
 
-            la_sun_mean = meanAngle([sh.la_sun for sh in shower_obj_dict[shower_no]])
-            L_g_mean = meanAngle([sh.L_g for sh in shower_obj_dict[shower_no]])
-            B_g_mean = np.mean([sh.B_g for sh in shower_obj_dict[shower_no]])
-            v_g_mean = np.mean([sh.v_g for sh in shower_obj_dict[shower_no]])
-
             # Init a new shower object
-            shower_obj_mean = MeteorShower(la_sun_mean, L_g_mean, B_g_mean, v_g_mean, shower_no)
+            shower_obj_mean = MeteorShower(la_sun_means[k], L_g_means[k], B_g_means[k], v_g_means[k], \
+                int(shower_nos[k]))
 
             shower_obj_list.append(shower_obj_mean)
 
 
 
-    print("Hyperbolic percentage: {:.2f}%".format(100*hypo_count/len(traj_list)))
+    print("Hyperbolic percentage: {:.2f}%".format(100*hypo_count/len(elliptic_mask)))
 
     # Compute the range of solar longitudes
-    sol_min = np.degrees(jd2SolLonSteyaert(jd_min))
-    sol_max = np.degrees(jd2SolLonSteyaert(jd_max))
+    sol_min, sol_max = np.degrees(jd2SolLonSteyaert(np.array([jd_min, jd_max])))
 
 
 
     # Plot SCE vs Vg
     if plot_vg:
-        plotSCE(lambda_list, beta_list, vg_list, (sol_min, sol_max), 
+        plotSCE(lambda_arr, beta_arr, vg_arr, (sol_min, sol_max), 
             "Sun-centered geocentric ecliptic coordinates", "$V_g$ (km/s)", dir_path, plot_name + "_vg.png", \
             shower_obj_list=shower_obj_list, plot_showers=plot_showers)
 
 
     # Plot SCE vs Sol
     if plot_sol:
-        plotSCE(lambda_list, beta_list, sol_list, (sol_min, sol_max), \
+        plotSCE(lambda_arr, beta_arr, sol_arr, (sol_min, sol_max), \
             "Sun-centered geocentric ecliptic coordinates", "Solar longitude (deg)", dir_path, \
             plot_name + "_sol.png", shower_obj_list=shower_obj_list, plot_showers=plot_showers)
     
@@ -600,7 +998,7 @@ def generateTrajectoryPlots(dir_path, traj_list, plot_name='scecliptic', plot_vg
     
     # Plot SCE orbit density
     if plot_density:
-        plotSCE(lambda_list, beta_list, None, (sol_min, sol_max), 
+        plotSCE(lambda_arr, beta_arr, None, (sol_min, sol_max), 
             "Sun-centered geocentric ecliptic coordinates", "Count", dir_path, plot_name + "_density.png", \
             density_plot=True, shower_obj_list=shower_obj_list, plot_showers=plot_showers)
 
@@ -640,37 +1038,38 @@ def generateStationPlot(dir_path, traj_list, color_scheme='light'):
 
     ### PLOT WORLD MAP ###
 
-    # Group stations into countries
-    country_dict = {}
-    for traj in traj_list:
+    # Collect the stations of all observations
+    obs_list = [obs for traj in traj_list for obs in traj.observations]
+    station_ids = np.array([obs.station_id for obs in obs_list], dtype=str)
 
-        for obs in traj.observations:
-
-            # Extract country code
-            country_code = obs.station_id[:2]
-
-            if country_code not in country_dict:
-                country_dict[country_code] = {}
-            
+    # Take the first observation of every station, keeping the order in which the stations were found
+    _, station_idx = np.unique(station_ids, return_index=True)
+    station_idx.sort()
 
-            if obs.station_id not in country_dict[country_code]:
-                country_dict[country_code][obs.station_id] = [obs.lat, obs.lon]
+    station_ids = station_ids[station_idx]
+    lat_all = np.degrees([obs_list[i].lat for i in station_idx])
+    lon_all = np.degrees([obs_list[i].lon for i in station_idx])
 
+    # Group stations into countries (the country code is given by the first two characters of the
+    #   station ID), in the order in which the countries were found
+    country_codes = station_ids.astype('U2')
+    country_list, country_idx, country_inv = np.unique(country_codes, return_index=True, \
+        return_inverse=True)
 
 
     # Plot stations in all countries
-    for country_code in country_dict:
+    for country_no in np.argsort(country_idx):
 
-        station_dict = country_dict[country_code]
+        country_mask = country_inv == country_no
 
         # Extract lat/lon
-        lat = np.degrees([station_dict[station_id][0] for station_id in station_dict])
-        lon = np.degrees([station_dict[station_id][1] for station_id in station_dict])
+        lat = lat_all[country_mask]
+        lon = lon_all[country_mask]
 
         # Convert lat/lon to x/y
         x, y = m(lon, lat)
 
-        plt.scatter(x, y, s=0.75, zorder=5, label="{:s}: {:d}".format(country_code, len(lat)))
+        plt.scatter(x, y, s=0.75, zorder=5, label="{:s}: {:d}".format(country_list[country_no], len(lat)))
 
 
     plt.legend(loc='lower left')
@@ -686,6 +1085,42 @@ def generateStationPlot(dir_path, traj_list, color_scheme='light'):
 
 
 
+def initPlottingWorker():
+    """ Initialize a worker process for plotting. The plotting modules are imported in the main block of
+        this script, which is not run in worker processes started with the spawn method.
+    """
+
+    global matplotlib, plt, Basemap
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.basemap import Basemap
+
+
+
+def plotSolarLongitudeBin(dir_path, cols_sol, shower_list, sol_min, sol_max):
+    """ Plot the trajectories in one solar longitude bin. This function is run in worker processes when bins
+        are plotted in parallel, so only the arrays of values needed for plotting are sent to the workers, 
+        not the trajectories.
+
+    Arguments:
+        dir_path: [str] Path to the directory where the plots will be saved.
+        cols_sol: [dict] Arrays of TRAJ_PLOT_ATTRS values of trajectories in the bin.
+        shower_list: [list] MeteorShower objects (None for sporadics) of trajectories in the bin.
+        sol_min: [float] Beginning of the solar longitude bin (deg).
+        sol_max: [float] End of the solar longitude bin (deg).
+    """
+
+    print("Plotting solar longitude range: {:.1f} - {:.1f}".format(sol_min, sol_max))
+
+    # Plot graphs per solar longitude
+    plotTrajectoryColumns(dir_path, cols_sol, shower_list=shower_list, \
+        plot_name="scecliptic_solrange_{:05.1f}-{:05.1f}".format(sol_min, sol_max), plot_sol=False, \
+        plot_showers=True)
+
+
+
 
 if __name__ == "__main__":
 
@@ -707,6 +1142,10 @@ if __name__ == "__main__":
     arg_parser.add_argument('-s', '--solstep', metavar='SOL_STEP', \
         help='Step in solar longitude for plotting (degrees). 2 deg by default.', type=float, default=2.0)
 
+    arg_parser.add_argument('-c', '--cores', metavar='CPU_CORES', \
+        help='Number of CPU cores used for loading trajectories and plotting. All available cores are used by default.', \
+        type=int, default=None)
+
     # Parse the command line arguments
     cml_args = arg_parser.parse_args()
 
@@ -738,100 +1177,32 @@ if __name__ == "__main__":
     ### ###
 
 
-    # Get a list of paths of all trajectory pickle files
-    traj_list = []
-    for entry in os.walk(cml_args.dir_path):
-
-        dir_path, _, file_names = entry
-
-        # Go through all files
-        for file_name in file_names:
-
-            # Check if the file is a pickel file
-            if file_name.endswith("_trajectory.pickle"):
-
-                # Load the pickle file
-                traj = loadPickle(dir_path, file_name)
-
-                
-                # Skip those with no orbit solution
-                if traj.orbit.ra_g is None:
-                    continue
-
-
-                ### MINIMUM POINTS
-                ### Reject all trajectories with small number of used points ###
-                points_count = [len(obs.time_data[obs.ignore_list == 0]) for obs in traj.observations \
-                    if obs.ignore_station == False]
-
-                if not points_count:
-                    continue
-
-                max_points = max(points_count)
-
-                if max_points < min_traj_points:
-                    # print("Skipping {:.2f} due to the small number of points...".format(traj.jdt_ref))
-                    continue
-
-                ###
+    # Load all trajectory pickle files in parallel, the filters are applied in the worker processes
+    traj_paths = [os.path.join(dir_path, file_name) for dir_path, file_name \
+        in findTrajectoryFiles(cml_args.dir_path)]
 
+    loadFunc = functools.partial(loadFilteredTrajectories, min_traj_points=min_traj_points, min_qc=min_qc, \
+        max_e=max_e, max_radiant_err=max_radiant_err, max_vg_err=max_vg_err, max_begin_ht=max_begin_ht, \
+        min_end_ht=min_end_ht)
 
-                ### CONVERGENCE ANGLE                
-                ### Reject all trajectories with a too small convergence angle ###
+    # Every worker loads and filters a batch of trajectories at once
+    batch_size = 32
+    traj_batches = [traj_paths[i:i + batch_size] for i in range(0, len(traj_paths), batch_size)]
 
-                if np.degrees(traj.best_conv_inter.conv_angle) < min_qc:
-                    # print("Skipping {:.2f} due to the small convergence angle...".format(traj.jdt_ref))
-                    continue
+    print("Loading {:d} trajectories...".format(len(traj_paths)))
+    with multiprocessing.Pool(cml_args.cores) as pool:
+        traj_list = [traj for traj_batch in pool.imap(loadFunc, traj_batches) for traj in traj_batch]
 
-                ###
-
-
-                ### MAXIMUM ECCENTRICITY ###
-
-                if traj.orbit.e > max_e:
-                    continue
-
-                ###
-
-
-                ### MAXIMUM RADIANT ERROR ###
-
-                if traj.uncertainties is not None:
-                    if np.degrees(np.hypot(traj.uncertainties.ra_g, \
-                        traj.uncertainties.dec_g)) > max_radiant_err:
-
-                        continue
-
-
-
-                ### MAXIMUM GEOCENTRIC VELOCITY ERROR ###
-
-                if traj.uncertainties is not None:
-                    if traj.uncertainties.v_g > traj.orbit.v_g*max_vg_err/100:
-                        continue
-
-                ###
-
-
-                ### HEIGHT FILTER ###
-
-                if traj.rbeg_ele/1000 > max_begin_ht:
-                    continue
-
-                if traj.rend_ele/1000 < min_end_ht:
-                    continue
-
-                ###
-
-
-                traj_list.append(traj)
 
 
 
+    # Associate all trajectories to showers, the associations are used both in the summary file and the plots
+    print("Associating showers...")
+    shower_dict = associateShowers(traj_list)
 
     # Generate the orbit summary file
     print("Writing summary file...")
-    writeOrbitSummaryFile(cml_args.dir_path, traj_list)
+    writeOrbitSummaryFile(cml_args.dir_path, traj_list, shower_dict=shower_dict)
 
     # Generate summary plots
     print("Plotting all trajectories...")
@@ -845,23 +1216,43 @@ if __name__ == "__main__":
 
     # Generate radiant plots per solar longitude (degrees)
     step = cml_args.solstep
-    for sol_min in np.arange(0, 360 + step, step):
-        sol_max = sol_min + step
+    sol_bins = np.arange(0, 360 + step, step)
 
-        # Extract only those trajectories with solar longitudes in the given range
-        traj_list_sol = [traj_temp for traj_temp in traj_list if \
-            (np.degrees(traj_temp.orbit.la_sun) >= sol_min) \
-            and (np.degrees(traj_temp.orbit.la_sun) < sol_max)]
+    # Extract the values used for plotting from all trajectories once, the bins are plotted from the arrays
+    plot_cols = attributeColumns(traj_list, TRAJ_PLOT_ATTRS)
+    shower_list_all = [shower_dict[id(traj)] for traj in traj_list]
 
+    # Assign all trajectories to solar longitude bins in a single pass, -1 marks those outside all bins
+    la_sun_deg = plot_cols['orbit.la_sun']*RAD2DEG
+    bin_idx = np.searchsorted(sol_bins, la_sun_deg, side='right') - 1
+    bin_idx[~(la_sun_deg < sol_bins[bin_idx] + step)] = -1
+
+    # Group the trajectories by bins, keeping their order inside every bin
+    bin_order = np.argsort(bin_idx, kind='stable')
+    bin_edges = np.searchsorted(bin_idx[bin_order], np.arange(len(sol_bins) + 1))
+
+    # Collect the values of trajectories in all solar longitude bins with data
+    sol_jobs = []
+    for sol_bin, sol_min in enumerate(sol_bins):
+        sol_max = sol_min + step
 
         # Skip solar longitudes with no data
-        if len(traj_list_sol) == 0:
+        if bin_edges[sol_bin + 1] == bin_edges[sol_bin]:
             continue
 
-        print("Plotting solar longitude range: {:.1f} - {:.1f}".format(sol_min, sol_max))
+        # Extract only those trajectories with solar longitudes in the given range
+        sol_idx = bin_order[bin_edges[sol_bin]:bin_edges[sol_bin + 1]]
+        cols_sol = {name: col[sol_idx] for name, col in plot_cols.items()}
+        shower_list = [shower_list_all[i] for i in sol_idx]
 
+        sol_jobs.append((cml_args.dir_path, cols_sol, shower_list, sol_min, sol_max))
 
-        # Plot graphs per solar longitude
-        generateTrajectoryPlots(cml_args.dir_path, traj_list_sol, \
-            plot_name="scecliptic_solrange_{:05.1f}-{:05.1f}".format(sol_min, sol_max), plot_sol=False, \
-            plot_showers=True)
+
+    # Plot the bins in parallel, every bin is an independent plot
+    if cml_args.cores == 1:
+        for sol_job in sol_jobs:
+            plotSolarLongitudeBin(*sol_job)
+
+    else:
+        with multiprocessing.Pool(cml_args.cores, initializer=initPlottingWorker) as pool:
+            pool.starmap(plotSolarLongitudeBin, sol_jobs, chunksize=1)
@@ -479,6 +479,9 @@ class TrajectoryCorrelator(object):
             # List of all candidate trajectories
             candidate_trajectories = []
 
+            # Index the observations in the bin by time, so the pairs are found quickly
+            self.dh.buildTimeIndex(unprocessed_observations)
+
             # Go through all unpaired and unprocessed meteor observations
             for met_obs in unprocessed_observations:
 
@@ -575,6 +578,10 @@ class TrajectoryCorrelator(object):
 
 
 
+            # The time index is not needed after pairing
+            self.dh.buildTimeIndex(None)
+
+
             ### Merge all candidate trajectories which share the same observations ###
             print("Merging broken observations...")
             merged_candidate_trajectories = []
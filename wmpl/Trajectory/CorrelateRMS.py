@@ -6,17 +6,20 @@ from __future__ import print_function, division, absolute_import
 
 import os
 import sys
-import re
+import math
 import argparse
 import json
-import copy
+import types
 import datetime
+import concurrent.futures
 
 import numpy as np
 
 from wmpl.Formats.CAMS import loadFTPDetectInfo
+from wmpl.Formats.RMSJSON import loadJSON
 from wmpl.Trajectory.CorrelateEngine import TrajectoryCorrelator, TrajectoryConstraints
 from wmpl.Utils.Math import generateDatetimeBins
+from wmpl.Utils.NumbaTools import NUMBA_AVAILABLE, njit
 from wmpl.Utils.Pickling import savePickle
 from wmpl.Utils.TrajConversions import jd2Date
 
@@ -30,6 +33,15 @@ OUTPUT_TRAJ_DIR = "trajectories"
 # Name of json file with the list of processed directories
 JSON_DB_NAME = "processed_trajectories.json"
 
+# Suffix of the log file to which processed directories are appended between database saves
+DB_LOG_SUFFIX = ".log"
+
+# The database file is rewritten when the log file is larger than this size (bytes)
+DB_LOG_MAX_SIZE = 4*1024**2
+
+# Reference time from which the mean times of observations are measured when pairing them
+PAIRING_EPOCH = datetime.datetime(2000, 1, 1, 0, 0, 0)
+
 ### ###
 
 
@@ -38,7 +50,9 @@ class DatabaseJSON(object):
 
         self.db_file_path = db_file_path
 
-        # List of processed directories (keys are station codes)
+        # Processed directories (keys are station codes). The directories of every station are kept as keys
+        #   of a dictionary, which works as an ordered set with fast membership checks. They are stored as
+        #   lists in the JSON file
         self.processed_dirs = {}
 
         # List of trajectories (keys are trajectory reference julian dates)
@@ -47,29 +61,117 @@ class DatabaseJSON(object):
         # Load the database from a JSON file
         self.load()
 
+        # Processed directories which were added since the database was last saved, as (station, dir) pairs.
+        #   They are only written to the log on disk when the database is saved
+        self.unsaved_dirs = []
+
+        # Flag which indicates that the database was changed since it was last saved (not saved to disk)
+        self.changed = False
+
 
     def load(self):
-        """ Load the database from a JSON file. """
+        """ Load the database from a JSON file and replay the log of processed directories which were added
+            after the JSON file was last written.
+        """
+
+        db_file_path = self.db_file_path
 
-        if os.path.exists(self.db_file_path):
-            with open(self.db_file_path) as f:
+        if os.path.exists(db_file_path):
+            with open(db_file_path) as f:
                 self.__dict__ = json.load(f)
 
+            # Keep the path the database was opened from, in case the database file was moved
+            self.db_file_path = db_file_path
+
+            # Convert the lists of processed directories to ordered sets
+            self.processed_dirs = {station_name: dict.fromkeys(station_dirs) for station_name, station_dirs \
+                in self.processed_dirs.items()}
+
+
+        # Replay the log
+        log_file_path = self.db_file_path + DB_LOG_SUFFIX
+        if os.path.exists(log_file_path):
+            with open(log_file_path) as f:
+                for line in f:
+
+                    # Skip the last line if it was only partially written
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+
+                    self.processed_dirs.setdefault(entry['station'], {})[entry['dir']] = None
+
+
+    def save(self, force=False):
+        """ Save the database of processed meteors to disk. Processed directories added since the last save
+            are appended to the log, and the full database is only rewritten when the log grows too large, or
+            when forced. The log is cleared after the database is written.
+
+        Keyword arguments:
+            force: [bool] Always rewrite the database file. False by default.
+        """
+
+        log_file_path = self.db_file_path + DB_LOG_SUFFIX
+
+        if not force:
 
-    def save(self):
-        """ Save the database of processed meteors to disk. """
+            if self.unsaved_dirs:
 
-        with open(self.db_file_path, 'w') as f:
-            self2 = copy.deepcopy(self)
-            f.write(json.dumps(self2, default=lambda o: o.__dict__, indent=4, sort_keys=True))
+                # If the last line of the log was only partially written, start a new line so the appended
+                #   entries are not merged with it
+                prefix = ''
+                if os.path.exists(log_file_path) and (os.path.getsize(log_file_path) > 0):
+                    with open(log_file_path, 'rb') as f:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b'\n':
+                            prefix = '\n'
+
+                with open(log_file_path, 'a') as f:
+                    f.write(prefix + ''.join([json.dumps({'station': station_name, 'dir': rel_proc_path}) \
+                        + '\n' for station_name, rel_proc_path in self.unsaved_dirs]))
+
+                self.unsaved_dirs = []
+
+            # All changes are now on disk
+            self.changed = False
+
+            if (not os.path.exists(log_file_path)) or (os.path.getsize(log_file_path) < DB_LOG_MAX_SIZE):
+                return
+
+
+        # Serialize the database entries directly, without making a copy of the database
+        db_dict = {
+            'db_file_path': self.db_file_path,
+            'processed_dirs': {station_name: list(station_dirs) for station_name, station_dirs \
+                in self.processed_dirs.items()},
+            'trajectories': self.trajectories
+            }
+
+        # Write to a temporary file first and then replace the database file with it, so the database is not
+        #   left truncated if the writing is interrupted
+        tmp_file_path = self.db_file_path + '.tmp'
+        with open(tmp_file_path, 'w') as f:
+            f.write(json.dumps(db_dict, indent=4, sort_keys=True))
+
+        os.replace(tmp_file_path, self.db_file_path)
+
+        # All logged entries are now in the database file
+        if os.path.exists(log_file_path):
+            os.remove(log_file_path)
+
+        self.unsaved_dirs = []
+        self.changed = False
 
 
     def addProcessedDir(self, station_name, rel_proc_path):
-        """ Add the processed directory to the list. """
+        """ Add the processed directory to the list. The directory is written to disk on the next save. """
 
         if station_name in self.processed_dirs:
             if not rel_proc_path in self.processed_dirs[station_name]:
-                self.processed_dirs[station_name].append(rel_proc_path)
+                self.processed_dirs[station_name][rel_proc_path] = None
+                self.unsaved_dirs.append((station_name, rel_proc_path))
+                self.changed = True
 
 
     def addTrajectory(self, traj, met_obs_list):
@@ -84,6 +186,10 @@ class DatabaseJSON(object):
 
 
 class MeteorPointRMS(object):
+
+    # There can be millions of meteor picks, so they are stored without an instance dictionary
+    __slots__ = ('frame', 'time_rel', 'x', 'y', 'ra', 'dec', 'azim', 'alt', 'intensity_sum', 'mag')
+
     def __init__(self, frame, time_rel, x, y, ra, dec, azim, alt, mag):
         """ Container for individual meteor picks. """
 
@@ -111,9 +217,18 @@ class MeteorPointRMS(object):
 
 
 class MeteorObsRMS(object):
-    def __init__(self, station_code, reference_dt, platepar, data, rel_proc_path):
+
+    # Meteor observations are stored without an instance dictionary, so they take less memory
+    __slots__ = ('station_code', 'reference_dt', 'platepar', 'data', 'rel_proc_path', 'processed', 'paired', \
+        'mean_dt', 'fov_beg', 'fov_end')
+
+    def __init__(self, station_code, reference_dt, platepar, data, rel_proc_path, mean_time_rel=None):
         """ Container for meteor observations with the interface compatible with the trajectory correlator
             interface. 
+
+        Keyword arguments:
+            mean_time_rel: [float] Mean relative time of all meteor picks (seconds). Computed from the picks
+                if not given.
         """
 
         self.station_code = station_code
@@ -128,9 +243,11 @@ class MeteorObsRMS(object):
         self.processed = False 
         self.paired = False
 
-        # Mean datetime of the observation
-        self.mean_dt = self.reference_dt + datetime.timedelta(seconds=np.mean([entry.time_rel \
-            for entry in self.data]))
+        # Mean datetime of the observation (the mean is computed directly, without creating an array first)
+        if mean_time_rel is None:
+            mean_time_rel = sum([entry.time_rel for entry in self.data])/len(self.data)
+
+        self.mean_dt = self.reference_dt + datetime.timedelta(seconds=mean_time_rel)
 
         
         ### Estimate if the meteor begins and ends inside the FOV ###
@@ -140,20 +257,24 @@ class MeteorObsRMS(object):
 
         half_index = len(data)//2
 
+        # Read the image resolution only once
+        x_res = self.platepar.X_res
+        y_res = self.platepar.Y_res
+
 
         # Find angular velocity at the beginning per every axis
-        dxdf_beg = (self.data[half_index].x - self.data[0].x)/(self.data[half_index].frame \
-            - self.data[0].frame)
-        dydf_beg = (self.data[half_index].y - self.data[0].y)/(self.data[half_index].frame \
-            - self.data[0].frame)
+        point_beg = self.data[0]
+        point_half = self.data[half_index]
+        df_beg = point_half.frame - point_beg.frame
+        dxdf_beg = (point_half.x - point_beg.x)/df_beg
+        dydf_beg = (point_half.y - point_beg.y)/df_beg
 
         # Compute locations of centroids 2 frames before the beginning
-        x_pre_begin = self.data[0].x - 2*dxdf_beg
-        y_pre_begin = self.data[0].y - 2*dydf_beg
+        x_pre_begin = point_beg.x - 2*dxdf_beg
+        y_pre_begin = point_beg.y - 2*dydf_beg
 
         # If the predicted point is inside the FOV, mark it as such
-        if (x_pre_begin > 0) and (x_pre_begin <= self.platepar.X_res) and (y_pre_begin > 0) \
-            and (y_pre_begin < self.platepar.Y_res):
+        if (x_pre_begin > 0) and (x_pre_begin <= x_res) and (y_pre_begin > 0) and (y_pre_begin < y_res):
 
             self.fov_beg = True
 
@@ -162,19 +283,20 @@ class MeteorObsRMS(object):
             self.data = self.data[1:]
 
 
-        # Find angular velocity at the ending per every axis
-        dxdf_end = (self.data[-1].x - self.data[half_index].x)/(self.data[-1].frame \
-            - self.data[half_index].frame)
-        dydf_end = (self.data[-1].y - self.data[half_index].y)/(self.data[-1].frame \
-            - self.data[half_index].frame)
+        # Find angular velocity at the ending per every axis (the points are taken after the first point might
+        #   have been excluded)
+        point_half = self.data[half_index]
+        point_end = self.data[-1]
+        df_end = point_end.frame - point_half.frame
+        dxdf_end = (point_end.x - point_half.x)/df_end
+        dydf_end = (point_end.y - point_half.y)/df_end
 
         # Compute locations of centroids 2 frames after the end
-        x_post_end = self.data[-1].x + 2*dxdf_end
-        y_post_end = self.data[-1].y + 2*dydf_end
+        x_post_end = point_end.x + 2*dxdf_end
+        y_post_end = point_end.y + 2*dydf_end
 
         # If the predicted point is inside the FOV, mark it as such
-        if (x_post_end > 0) and (x_post_end <= self.platepar.X_res) and (y_post_end > 0) \
-            and (y_post_end <= self.platepar.Y_res):
+        if (x_post_end > 0) and (x_post_end <= x_res) and (y_post_end > 0) and (y_post_end <= y_res):
             
             self.fov_end = True
 
@@ -186,23 +308,217 @@ class MeteorObsRMS(object):
 
 
 
-class PlateparDummy:
-    def __init__(self, **entries):
-        """ This class takes a platepar dictionary and converts it into an object. """
-        self.__dict__.update(entries)
+class PlateparDummy(types.SimpleNamespace):
+    """ This class takes a platepar dictionary and converts it into an object. Platepars can have arbitrary
+        keys so they can't use __slots__, but SimpleNamespace is constructed in C.
+    """
+
+
+
+def loadFolderObservations(station_code, rel_proc_path, proc_path):
+    """ Load meteor observations from one data folder. This function is run in worker processes when folders 
+        are loaded in parallel.
+
+    Arguments:
+        station_code: [str] Station code.
+        rel_proc_path: [str] Path to the data folder, relative to the root data directory.
+        proc_path: [str] Full path to the data folder.
+
+    Return:
+        [list or None] A list of MeteorObsRMS objects, or None if the data files were not found in the folder.
+    """
+
+    ftpdetectinfo_name = None
+    platepar_recalibrated_name = None
+
+    # Find FTPdetectinfo and platepar files
+    with os.scandir(proc_path) as file_entries:
+        for file_entry in file_entries:
+
+            name = file_entry.name
+
+            # Find FTPdetectinfo
+            if name.startswith("FTPdetectinfo") and name.endswith('.txt') and \
+                (not "backup" in name) and (not "uncalibrated" in name):
+                ftpdetectinfo_name = name
+
+            elif name == "platepars_all_recalibrated.json":
+                platepar_recalibrated_name = name
+
+            # Stop the search when both files are found
+            if (ftpdetectinfo_name is not None) and (platepar_recalibrated_name is not None):
+                break
+
+    # Skip these observations if no data files were found inside
+    if (ftpdetectinfo_name is None) or (platepar_recalibrated_name is None):
+        return None
+
+
+    # Load platepars (orjson or simdjson are used for parsing if they are available)
+    platepars_recalibrated_dict = loadJSON(os.path.join(proc_path, platepar_recalibrated_name))
+
+    # If all files exist, init the meteor container object
+    cams_met_obs_list = RMSDataHandle.initMeteorObs(station_code, os.path.join(proc_path, \
+        ftpdetectinfo_name), platepars_recalibrated_dict)
+
+    # Format the observation object to the one required by the trajectory correlator
+    met_obs_list = []
+    pp_cache = {}
+    for cams_met_obs in cams_met_obs_list:
+
+        # Get the platepar, meteors from the same FF file share the platepar object
+        pp = pp_cache.get(cams_met_obs.ff_name)
+        if pp is None:
+            pp = PlateparDummy(**platepars_recalibrated_dict[cams_met_obs.ff_name])
+            pp_cache[cams_met_obs.ff_name] = pp
+
+        # Init meteor data (angles are converted to degrees for the whole meteor at once)
+        meteor_data = list(map(MeteorPointRMS, cams_met_obs.frames, cams_met_obs.time_data, \
+            cams_met_obs.x_data, cams_met_obs.y_data, np.degrees(cams_met_obs.ra_data), \
+            np.degrees(cams_met_obs.dec_data), np.degrees(cams_met_obs.azim_data), \
+            np.degrees(cams_met_obs.elev_data), cams_met_obs.mag_data))
+
+
+        # Init the new meteor observation object
+        # The mean time is computed from the time array which is already available
+        met_obs = MeteorObsRMS(station_code, jd2Date(cams_met_obs.jdt_ref, dt_obj=True), pp, \
+            meteor_data, rel_proc_path, mean_time_rel=float(np.mean(cams_met_obs.time_data)))
+
+        met_obs_list.append(met_obs)
+
+
+    return met_obs_list
+
+
+
+def isStationName(name):
+    """ Check if the name is a station code, i.e. 2 uppercase letters followed by 4 uppercase letters or
+        digits (e.g. HR0001). This is equivalent to matching ^[A-Z]{2}[A-Z0-9]{4}$, but faster.
+
+    Arguments:
+        name: [str] Name to check.
+
+    Return:
+        [bool] True if the name is a station code.
+    """
+
+    return (len(name) == 6) and name.isascii() and name.isalnum() and name[:2].isalpha() and name.isupper()
+
+
+
+def parseNightDatetime(night_name):
+    """ Extract the date and time from the name of the night directory (e.g.
+        HR0001_20190707_192835_241084_detected).
+
+    Arguments:
+        night_name: [str] Name of the night directory.
+
+    Return:
+        [datetime] Date and time of the night directory, or None if it could not be parsed.
+    """
+
+    name_split = night_name.split("_")
+    if len(name_split) < 3:
+        return None
+
+    date_str, time_str = name_split[1:3]
+
+    try:
+
+        # Parse the common format directly, it is much faster than strptime
+        if (len(date_str) == 8) and (len(time_str) == 6) and date_str.isdigit() and time_str.isdigit() \
+            and date_str.isascii() and time_str.isascii():
+
+            return datetime.datetime(int(date_str[:4]), int(date_str[4:6]), int(date_str[6:8]), \
+                int(time_str[:2]), int(time_str[2:4]), int(time_str[4:6]))
+
+        # Fall back to strptime for other cases, as it also accepts e.g. single digit months
+        return datetime.datetime.strptime(date_str + "_" + time_str, "%Y%m%d_%H%M%S")
+
+    except ValueError:
+        return None
+
+
+
+def nightDatetimeArray(processing_list):
+    """ Return the night datetimes of the folders for processing as a numpy datetime64 array.
+
+    Arguments:
+        processing_list: [list] A list of folders for processing, as returned by findUnprocessedFolders.
+
+    Return:
+        [ndarray] Night datetimes (datetime64[us]), NaT for folders whose datetime is not known.
+    """
+
+    return np.array([np.datetime64('NaT') if entry[3] is None else entry[3] for entry in processing_list], \
+        dtype='datetime64[us]')
+
+
+
+@njit(cache=True)
+def _timePairsWindowNumba(times, station_ids, beg, end, t_ref, station_id_ref, max_toffset):
+    """ Return the indices of observations in the [beg, end) window of the time index which are from a
+        different station and within max_toffset seconds from the reference time. Times are given in
+        integer microseconds.
+    """
+
+    pair_indices = np.empty(end - beg, dtype=np.int64)
+
+    n_pairs = 0
+    for i in range(beg, end):
+        if (station_ids[i] != station_id_ref) and (abs(times[i] - t_ref)/1e6 <= max_toffset):
+            pair_indices[n_pairs] = i
+            n_pairs += 1
+
+    return pair_indices[:n_pairs]
+
+
+
+def timePairsWindow(times, station_ids, beg, end, t_ref, station_id_ref, max_toffset):
+    """ Return the indices of observations in the [beg, end) window of the time index which are from a
+        different station and within max_toffset seconds from the reference time. A compiled loop is used if
+        numba is available.
+
+    Arguments:
+        times: [ndarray] Sorted mean times of observations (int64 microseconds).
+        station_ids: [ndarray] Integer station IDs of observations, in the same order as times.
+        beg: [int] First index of the window.
+        end: [int] Index after the last index of the window.
+        t_ref: [int] Mean time of the reference observation (microseconds).
+        station_id_ref: [int] Station ID of the reference observation.
+        max_toffset: [float] Maximum offset in time (seconds).
+
+    Return:
+        [ndarray] Indices into the time index of the observations which are pairs.
+    """
+
+    if NUMBA_AVAILABLE:
+        return _timePairsWindowNumba(times, station_ids, int(beg), int(end), int(t_ref), \
+            int(station_id_ref), float(max_toffset))
+
+    window_mask = (np.abs(times[beg:end] - t_ref)/1e6 <= max_toffset) \
+        & (station_ids[beg:end] != station_id_ref)
+
+    return beg + np.flatnonzero(window_mask)
 
 
 
 class RMSDataHandle(object):
-    def __init__(self, dir_path):
+    def __init__(self, dir_path, compress_pickles=False):
         """ Handles data interfacing between the trajectory correlator and RMS data files on disk. 
     
         Arguments:
             dir_path: [str] Path to the directory with data files. 
+
+        Keyword arguments:
+            compress_pickles: [bool] Compress the trajectory pickle files with zstandard, if it is installed. 
+                False by default.
         """
 
         self.dir_path = dir_path
 
+        self.compress_pickles = compress_pickles
+
         print("Using directory:", self.dir_path)
 
         # Load the list of stations
@@ -214,21 +530,37 @@ class RMSDataHandle(object):
         # Find unprocessed meteor files
         self.processing_list = self.findUnprocessedFolders(station_list)
 
+        # Night datetimes of all folders for processing, used to select folders in time bins
+        self.processing_night_dts = nightDatetimeArray(self.processing_list)
+
+        # Time index of the observations which are being paired, built by buildTimeIndex
+        self.pairing_observations = None
+        self.pairing_order = None
+        self.pairing_times = None
+        self.pairing_stations = None
+        self.pairing_station_ids = None
+
+        # Compile the pairing function before the observations are paired
+        if NUMBA_AVAILABLE:
+            timePairsWindow(np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int32), 0, 1, 0, -1, 1.0)
+
 
     def loadStations(self):
         """ Load the station names in the processing folder. """
 
         station_list = []
 
-        for dir_name in os.listdir(self.dir_path):
+        # The directory entries already know if they are directories, so no additional stat calls are needed
+        with os.scandir(self.dir_path) as dir_entries:
+            for dir_entry in dir_entries:
 
-            # Check if the dir name matches the station name pattern
-            if os.path.isdir(os.path.join(self.dir_path, dir_name)):
-                if re.match("^[A-Z]{2}[A-Z0-9]{4}$", dir_name):
-                    print("Using station:", dir_name)
-                    station_list.append(dir_name)
-                else:
-                    print("Skipping directory:", dir_name)
+                # Check if the dir name matches the station name pattern
+                if dir_entry.is_dir():
+                    if isStationName(dir_entry.name):
+                        print("Using station:", dir_entry.name)
+                        station_list.append(dir_entry.name)
+                    else:
+                        print("Skipping directory:", dir_entry.name)
 
 
         return station_list
@@ -241,6 +573,7 @@ class RMSDataHandle(object):
         processing_list = []
 
         skipped_dirs = 0
+        unparsed_dirs = 0
 
         # Go through all station directories
         for station_name in station_list:
@@ -249,21 +582,21 @@ class RMSDataHandle(object):
 
             # Add the station name to the database if it doesn't exist
             if station_name not in self.db.processed_dirs:
-                self.db.processed_dirs[station_name] = []
+                self.db.processed_dirs[station_name] = {}
 
             # Go through all directories in stations
-            for night_name in os.listdir(station_path):
+            with os.scandir(station_path) as night_entries:
+                night_names = [night_entry.name for night_entry in night_entries]
+
+            for night_name in night_names:
 
                 night_path = os.path.join(station_path, night_name)
                 night_path_rel = os.path.join(station_name, night_name)
 
                 # Extract the date and time of directory, if possible
-                try:
-                    night_dt = datetime.datetime.strptime("_".join(night_name.split("_")[1:3]), \
-                        "%Y%m%d_%H%M%S")
-                except:
-                    print("Could not parse the date of the night dir: {:s}".format(night_path))
-                    night_dt = None
+                night_dt = parseNightDatetime(night_name)
+                if night_dt is None:
+                    unparsed_dirs += 1
 
                 # If the night path is not in the processed list, add it to the processing list
                 if night_path_rel not in self.db.processed_dirs[station_name]:
@@ -276,11 +609,15 @@ class RMSDataHandle(object):
         if skipped_dirs:
             print("Skipped {:d} processed directories".format(skipped_dirs))
 
+        if unparsed_dirs:
+            print("Could not parse the date of {:d} night directories".format(unparsed_dirs))
+
         return processing_list
 
 
 
-    def initMeteorObs(self, station_code, ftpdetectinfo_path, platepars_recalibrated_dict):
+    @staticmethod
+    def initMeteorObs(station_code, ftpdetectinfo_path, platepars_recalibrated_dict):
         """ Init meteor observations from the FTPdetectinfo file and recalibrated platepars. """
 
         # Load station coordinates
@@ -301,41 +638,58 @@ class RMSDataHandle(object):
 
 
 
-    def loadUnprocessedObservations(self, processing_list, dt_range=None):
-        """ Load unprocessed meteor observations. """
+    def loadUnprocessedObservations(self, processing_list, dt_range=None, max_workers=None):
+        """ Load unprocessed meteor observations. Folders are loaded in parallel worker processes.
 
-        # Go through folders for processing
-        met_obs_list = []
-        for station_code, rel_proc_path, proc_path, night_dt in processing_list:
+        Arguments:
+            processing_list: [list] A list of folders for processing, as returned by findUnprocessedFolders.
 
-            # Check that the night datetime is within the given range of times, if the range is given
-            if (dt_range is not None) and (night_dt is not None):
-                dt_beg, dt_end = dt_range
+        Keyword arguments:
+            dt_range: [list] A list of two datetime objects. Only folders with the night datetime between
+                these times are loaded. None by default, which loads all folders.
+            max_workers: [int] Maximum number of worker processes. None by default, which uses all
+                available CPU cores.
 
-                # Skip all folders which are outside the limits
-                if (night_dt < dt_beg) or (night_dt > dt_end):
-                    continue
+        Return:
+            [list] A list of MeteorObsRMS objects.
+        """
 
+        # Check that the night datetimes are within the given range of times, if the range is given. Folders
+        #   with unknown night datetimes are always used
+        if dt_range is not None:
+            dt_beg, dt_end = dt_range
 
+            if processing_list is self.processing_list:
+                night_dts = self.processing_night_dts
+            else:
+                night_dts = nightDatetimeArray(processing_list)
 
-            ftpdetectinfo_name = None
-            platepar_recalibrated_name = None
+            in_range = np.isnat(night_dts) \
+                | ((night_dts >= np.datetime64(dt_beg, 'us')) & (night_dts <= np.datetime64(dt_end, 'us')))
 
-            # Find FTPdetectinfo and platepar files
-            for name in os.listdir(proc_path):
-                    
-                # Find FTPdetectinfo
-                if name.startswith("FTPdetectinfo") and name.endswith('.txt') and \
-                    (not "backup" in name) and (not "uncalibrated" in name):
-                    ftpdetectinfo_name = name
-                    continue
+            processing_list = [processing_list[i] for i in np.flatnonzero(in_range)]
 
-                if name == "platepars_all_recalibrated.json":
-                    platepar_recalibrated_name = name
-                    continue
+
+        # Select folders for processing
+        load_list = [[station_code, rel_proc_path, proc_path] for station_code, rel_proc_path, proc_path, _ \
+            in processing_list]
+
+
+        # Load the folders in parallel, the observations are returned in the order of folders
+        met_obs_list = []
+        if load_list:
+
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+                folder_results = list(executor.map(loadFolderObservations, *zip(*load_list), chunksize=4))
+
+        else:
+            folder_results = []
+
+
+        for (station_code, rel_proc_path, _), folder_met_obs_list in zip(load_list, folder_results):
 
             # Skip these observations if no data files were found inside
-            if (ftpdetectinfo_name is None) or (platepar_recalibrated_name is None):
+            if folder_met_obs_list is None:
                 print("Skipping {:s} due to missing data files...".format(rel_proc_path))
 
                 # Add the folder to the list of processed folders
@@ -343,68 +697,74 @@ class RMSDataHandle(object):
 
                 continue
 
-            # Save database to mark those with missing data files
-            self.db.save()
+            for met_obs in folder_met_obs_list:
+                print(station_code, met_obs.reference_dt, rel_proc_path)
 
+            met_obs_list += folder_met_obs_list
 
-            # Load platepars
-            with open(os.path.join(proc_path, platepar_recalibrated_name)) as f:
-                platepars_recalibrated_dict = json.load(f)
 
-            # If all files exist, init the meteor container object
-            cams_met_obs_list = self.initMeteorObs(station_code, os.path.join(proc_path, \
-                ftpdetectinfo_name), platepars_recalibrated_dict)
+        # Save database to mark those with missing data files (only if any were added since the last save)
+        if self.db.changed:
+            self.db.save()
 
-            # Format the observation object to the one required by the trajectory correlator
-            for cams_met_obs in cams_met_obs_list:
 
-                # Get the platepar
-                pp_dict = platepars_recalibrated_dict[cams_met_obs.ff_name]
-                pp = PlateparDummy(**pp_dict)
+        return met_obs_list
 
-                # Init meteor data
-                meteor_data = []
-                for entry in zip(cams_met_obs.frames, cams_met_obs.time_data, cams_met_obs.x_data,\
-                    cams_met_obs.y_data, cams_met_obs.azim_data, cams_met_obs.elev_data, \
-                    cams_met_obs.ra_data, cams_met_obs.dec_data, cams_met_obs.mag_data):
 
-                    frame, time_rel, x, y, azim, alt, ra, dec, mag = entry
 
-                    met_point = MeteorPointRMS(frame, time_rel, x, y, np.degrees(ra), np.degrees(dec), \
-                        np.degrees(azim), np.degrees(alt), mag)
+    def getPlatepar(self, met_obs):
+        """ Return the platepar of the meteor observation. """
 
-                    meteor_data.append(met_point)
+        return met_obs.platepar
 
 
-                # Init the new meteor observation object
-                met_obs = MeteorObsRMS(station_code, jd2Date(cams_met_obs.jdt_ref, dt_obj=True), pp, \
-                    meteor_data, rel_proc_path)
 
-                print(station_code, met_obs.reference_dt, rel_proc_path)
+    def getUnprocessedObservations(self):
+        """ Returns a list of unprocessed meteor observations. """
 
-                met_obs_list.append(met_obs)
+        return self.unprocessed_observations
 
 
-        return met_obs_list
+    def buildTimeIndex(self, unprocessed_observations):
+        """ Build the time index of observations which will be paired by findTimePairs. The observations are 
+            sorted by their mean time, so the pairs are found by a binary search. The index has to be built
+            again every time the list of observations changes.
 
+        Arguments:
+            unprocessed_observations: [list] A list of MeteorObsRMS objects. If None, the index is cleared.
+        """
 
+        if unprocessed_observations is None:
+            self.pairing_observations = None
+            self.pairing_order = None
+            self.pairing_times = None
+            self.pairing_stations = None
+            self.pairing_station_ids = None
 
-    def getPlatepar(self, met_obs):
-        """ Return the platepar of the meteor observation. """
+            return
 
-        return met_obs.platepar
 
+        # Keep a copy of the list, so the index matches the observations even if the given list is changed
+        self.pairing_observations = list(unprocessed_observations)
 
+        # Times are stored as integer microseconds, so they are compared exactly
+        mean_times = np.array([(met_obs.mean_dt - PAIRING_EPOCH)//datetime.timedelta(microseconds=1) \
+            for met_obs in self.pairing_observations], dtype=np.int64)
 
-    def getUnprocessedObservations(self):
-        """ Returns a list of unprocessed meteor observations. """
+        # Station codes are mapped to integer IDs, so stations are compared as integers
+        self.pairing_station_ids = {}
+        station_ids = np.array([self.pairing_station_ids.setdefault(met_obs.station_code, \
+            len(self.pairing_station_ids)) for met_obs in self.pairing_observations], dtype=np.int32)
+
+        self.pairing_order = np.argsort(mean_times, kind='stable')
+        self.pairing_times = mean_times[self.pairing_order]
+        self.pairing_stations = station_ids[self.pairing_order]
 
-        return self.unprocessed_observations
 
 
     def findTimePairs(self, met_obs, unprocessed_observations, max_toffset):
         """ Finds pairs in time between the given meteor observations and all other observations from 
-            different stations. 
+            different stations. The time index built by buildTimeIndex is used for the search.
 
         Arguments:
             met_obs: [MeteorObsRMS] Object containing a meteor observation.
@@ -417,18 +777,30 @@ class RMSDataHandle(object):
                 met_obs.
         """
 
-        found_pairs = []
+        # Build the time index if it wasn't built, or if it was built for a different number of observations
+        if (self.pairing_observations is None) \
+            or (len(self.pairing_observations) != len(unprocessed_observations)):
 
-        # Go through all meteors from other stations
-        for met_obs2 in unprocessed_observations:
+            self.buildTimeIndex(unprocessed_observations)
 
-            # Take only observations from different stations
-            if met_obs.station_code == met_obs2.station_code:
-                continue
 
-            # Take observations which are within the given time window
-            if abs((met_obs.mean_dt - met_obs2.mean_dt).total_seconds()) <= max_toffset:
-                found_pairs.append(met_obs2)
+        # Find the window of observations which are close in time (with a margin of 1 microsecond)
+        t_ref = (met_obs.mean_dt - PAIRING_EPOCH)//datetime.timedelta(microseconds=1)
+        max_toffset_us = int(math.ceil(max_toffset*1e6)) + 1
+        beg = np.searchsorted(self.pairing_times, t_ref - max_toffset_us, side='left')
+        end = np.searchsorted(self.pairing_times, t_ref + max_toffset_us, side='right')
+
+        # Get the integer ID of the station. The station IDs are mapped from the same copy of observations as
+        #   the index, so a station without an ID has no observations in the index and none have to be
+        #   excluded (-1 doesn't match any station)
+        station_id = self.pairing_station_ids.get(met_obs.station_code, -1)
+
+        # Take observations from different stations which are within the given time window
+        pair_indices = timePairsWindow(self.pairing_times, self.pairing_stations, beg, end, t_ref, \
+            station_id, max_toffset)
+
+        # Return the pairs in the order of the given list of observations
+        found_pairs = [self.pairing_observations[i] for i in np.sort(self.pairing_order[pair_indices])]
 
 
         return found_pairs
@@ -439,17 +811,18 @@ class RMSDataHandle(object):
         """ Save trajectory results to the disk. """
 
 
-        # Generate the name for the output directory (add list of country codes at the end)
+        # Generate the name for the output directory (add list of country codes at the end). The country
+        #   codes are sorted, so the name of the directory is the same between runs
         output_dir = os.path.join(self.dir_path, OUTPUT_TRAJ_DIR, \
             jd2Date(traj.jdt_ref, dt_obj=True).strftime("%Y%m%d_%H%M%S.%f")[:-3] + "_" \
-            + "_".join(list(set([obs.station_id[:2] for obs in traj.observations]))))
+            + "_".join(sorted({obs.station_id[:2] for obs in traj.observations})))
 
         # Save the report
         traj.saveReport(output_dir, traj.file_name + '_report.txt', uncertainties=traj.uncertainties, 
             verbose=False)
 
         # Save the picked trajectory structure
-        savePickle(traj, output_dir, traj.file_name + '_trajectory.pickle')
+        savePickle(traj, output_dir, traj.file_name + '_trajectory.pickle', compress=self.compress_pickles)
 
         # Save the plots
         if save_plots:
@@ -477,7 +850,7 @@ class RMSDataHandle(object):
         """ Finish the processing run. """
 
         # Save the processed directories to the DB file
-        self.db.save()
+        self.db.save(force=True)
 
         # Save the list of processed meteor observations
 
@@ -543,6 +916,10 @@ contain data folders. Data folders should have FTPdetectinfo files together with
         help='Save plots to disk.', action="store_true")
 
 
+    arg_parser.add_argument('-z', '--zstd', \
+        help='Compress the trajectory pickle files with zstandard (if installed). They can then only be loaded with wmpl.Utils.Pickling.loadPickle.', \
+        action="store_true")
+
     arg_parser.add_argument('-r', '--timerange', metavar='TIME_RANGE', \
         help="""Only compute the trajectories in the given range of time. The time range should be given in the format: "(YYYYMMDD-HHMMSS,YYYYMMDD-HHMMSS)".""", \
             type=str)
@@ -574,7 +951,7 @@ contain data folders. Data folders should have FTPdetectinfo files together with
     t1 = datetime.datetime.utcnow()
 
     # Init the data handle
-    dh = RMSDataHandle(cml_args.dir_path)
+    dh = RMSDataHandle(cml_args.dir_path, compress_pickles=cml_args.zstd)
 
 
     # If there is nothing to process, stop
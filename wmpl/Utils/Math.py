@@ -14,6 +14,7 @@ import scipy.stats
 import scipy.spatial
 import scipy.optimize
 
+from wmpl.Utils.NumbaTools import NUMBA_AVAILABLE, njit
 
 
 ### BASIC FUNCTIONS ###
@@ -743,6 +744,57 @@ def RMSD(x, weights=None):
     
 
 
+@njit(cache=True)
+def averageClosePointsNumba(x_array, y_array, delta):
+    """ Numba kernel for averageClosePoints, see that function for details. Only numeric 1D arrays are 
+        supported.
+
+    Return:
+        x_final, y_final: [tuple of ndarrays] Processed x and y arrays.
+    """
+
+    n = x_array.shape[0]
+
+    x_final = np.empty(n, dtype=x_array.dtype)
+    y_final = np.empty(n)
+    n_final = 0
+    skip = 0
+
+    # Step through all x values
+    for i in range(n):
+
+        if skip > 0:
+            skip -= 1
+            continue
+
+        # Count the number of close points to this element
+        count = 0
+        for j in range(n):
+            if abs(x_array[j] - x_array[i]) < delta:
+                count += 1
+
+        # If there are more than one, average them and put them to the list
+        if count > 1:
+
+            skip += count - 1
+
+            y = np.mean(y_array[i:min(i + count, n)])
+
+        # If there are no close points, add the current point to the list
+        else:
+
+            y = y_array[i]
+
+
+        x_final[n_final] = x_array[i]
+        y_final[n_final] = y
+        n_final += 1
+
+
+    return x_final[:n_final], y_final[:n_final]
+
+
+
 def averageClosePoints(x_array, y_array, delta, x_datetime=False):
     """ Finds if points have similar sample values on the independant axis x (if they are within delta) and 
         averages all y values.
@@ -761,6 +813,16 @@ def averageClosePoints(x_array, y_array, delta, x_datetime=False):
 
     """
 
+    # Use the compiled kernel for floating point arrays
+    if NUMBA_AVAILABLE and (not x_datetime) and isinstance(x_array, np.ndarray) \
+        and isinstance(y_array, np.ndarray) and (x_array.ndim == 1) and (y_array.ndim == 1) \
+        and (x_array.dtype.kind == 'f') and (y_array.dtype.kind == 'f'):
+
+        x_final, y_final = averageClosePointsNumba(x_array, y_array, delta)
+
+        return list(x_final), list(y_final)
+
+
     x_final = []
     y_final = []
     skip = 0
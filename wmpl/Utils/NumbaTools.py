@@ -0,0 +1,38 @@
+""" Optional numba support. If numba is not installed, the decorators below return the functions unchanged, 
+    so they are run as regular Python code.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+
+def njit(*args, **kwargs):
+    """ Wrapper around numba.njit which does nothing if numba is not available. Can be used both as @njit 
+        and as @njit(...) with numba keyword arguments.
+    """
+
+    if NUMBA_AVAILABLE:
+        return numba.njit(*args, **kwargs)
+
+    # The decorator was used without arguments
+    if (len(args) == 1) and callable(args[0]) and (not kwargs):
+        return args[0]
+
+    return lambda func: func
+
+
+
+# Parallel range used inside numba functions, falls back to the regular range
+if NUMBA_AVAILABLE:
+    prange = numba.prange
+
+else:
+    prange = range
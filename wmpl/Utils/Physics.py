@@ -7,6 +7,8 @@ import numpy as np
 import scipy.interpolate
 
 from wmpl.Utils.AtmosphereDensity import getAtmDensity_vect
+from wmpl.Utils.Math import averageClosePoints, averageClosePointsNumba
+from wmpl.Utils.NumbaTools import NUMBA_AVAILABLE, njit
 
 
 def dynamicPressure(lat, lon, height, jd, velocity, gamma=1.0):
@@ -127,6 +129,144 @@ def calcMass(time, mag_abs, velocity, tau=0.007, P_0m=840.0):
 
 
 
+@njit(cache=True)
+def _pchipIntegral(x, y):
+    """ Integrate the PCHIP interpolant of the given points over the whole range of x. The derivatives are 
+        computed in the same way as in scipy.interpolate.PchipInterpolator, and the cubic Hermite polynomial 
+        is integrated analytically on every interval.
+
+    Arguments:
+        x: [ndarray] Strictly increasing independent values.
+        y: [ndarray] Dependent values.
+
+    Return:
+        [float] Integral of the interpolant from x[0] to x[-1].
+    """
+
+    n = x.shape[0]
+
+    if n < 2:
+        raise ValueError("At least 2 points are needed for PCHIP interpolation!")
+
+    h = np.empty(n - 1)
+    m = np.empty(n - 1)
+    for k in range(n - 1):
+
+        h[k] = x[k + 1] - x[k]
+
+        if h[k] <= 0:
+            raise ValueError("x must be a strictly increasing sequence!")
+
+        m[k] = (y[k + 1] - y[k])/h[k]
+
+
+    d = np.empty(n)
+
+    # Two points are interpolated by a line
+    if n == 2:
+        d[0] = m[0]
+        d[1] = m[0]
+
+    else:
+
+        # Weighted harmonic mean of the slopes at interior points, or 0 at local extrema
+        for k in range(1, n - 1):
+
+            if (np.sign(m[k - 1]) != np.sign(m[k])) or (m[k - 1] == 0) or (m[k] == 0):
+                d[k] = 0.0
+
+            else:
+                w1 = 2*h[k] + h[k - 1]
+                w2 = h[k] + 2*h[k - 1]
+                d[k] = (w1 + w2)/(w1/m[k - 1] + w2/m[k])
+
+
+        # One-sided three-point estimates at the end points
+        for k, h0, h1, m0, m1 in ((0, h[0], h[1], m[0], m[1]), (n - 1, h[n - 2], h[n - 3], m[n - 2], m[n - 3])):
+
+            d_edge = ((2*h0 + h1)*m0 - h0*m1)/(h0 + h1)
+
+            if np.sign(d_edge) != np.sign(m0):
+                d_edge = 0.0
+
+            elif (np.sign(m0) != np.sign(m1)) and (abs(d_edge) > 3*abs(m0)):
+                d_edge = 3*m0
+
+            d[k] = d_edge
+
+
+    # Integrate the cubic Hermite polynomials
+    integral = 0.0
+    for k in range(n - 1):
+        integral += h[k]*(y[k] + y[k + 1])/2 + h[k]**2*(d[k] - d[k + 1])/12
+
+    return integral
+
+
+
+@njit(cache=True)
+def _calcMassLightCurveNumba(time, mag_abs, delta, velocity, tau, P_0m):
+    """ Numba kernel for calcMassLightCurve, see that function for details. """
+
+    # Sort the points by time (mergesort is stable, so points at the same time keep their order)
+    sort_idx = np.argsort(time, kind='mergesort')
+    time = time[sort_idx]
+    mag_abs = mag_abs[sort_idx]
+
+    # Average out the magnitudes of close points
+    time_avg, mag_avg = averageClosePointsNumba(time, mag_abs, delta)
+
+
+    # Calculate the intensities from absolute magnitudes and integrate them
+    intens = P_0m*10**(-0.4*mag_avg)
+    intens_int = _pchipIntegral(time_avg, intens)
+
+    # Calculate the mass
+    return (2.0/(tau*velocity**2))*intens_int
+
+
+
+def calcMassLightCurve(time, mag_abs, delta, velocity, tau=0.007, P_0m=840.0):
+    """ Calculates the mass of a meteoroid from unsorted light curve points, possibly from multiple stations.
+        The points are sorted by time, the magnitudes of points closer than delta in time are averaged 
+        (see averageClosePoints), and the mass is computed from the averaged light curve (see calcMass).
+        If numba is available, all steps are done in one compiled function.
+
+    Arguments:
+        time: [ndarray] Time of individual magnitude measurement (s).
+        mag_abs: [nadrray] Absolute magnitudes (i.e. apparent meteor magnitudes @100km).
+        delta: [float] Points closer than delta in time (s) are averaged.
+        velocity: [float] Average velocity of the meteor in m/s.
+
+    Keyword arguments:
+        tau: [float] Luminous efficiency. 0.7% by default (Ceplecha & McCrosky, 1976)
+        P_0m: [float] Power output of a zero absolute magnitude meteor. 840W by default.
+
+    Return:
+        mass: [float] Photometric mass of the meteoroid in kg.
+
+    """
+
+    time = np.asarray(time, dtype=np.float64)
+    mag_abs = np.asarray(mag_abs, dtype=np.float64)
+
+    if NUMBA_AVAILABLE:
+        return _calcMassLightCurveNumba(time, mag_abs, float(delta), float(velocity), float(tau), float(P_0m))
+
+
+    # Sort the points by time
+    sort_idx = np.argsort(time, kind='stable')
+    time = time[sort_idx]
+    mag_abs = mag_abs[sort_idx]
+
+    # Average out the magnitudes
+    time, mag_abs = averageClosePoints(time, mag_abs, delta)
+
+    return calcMass(np.array(time), np.array(mag_abs), velocity, tau=tau, P_0m=P_0m)
+
+
+
+
 if __name__ == "__main__":
 
     import datetime
@@ -140,4 +280,48 @@ if __name__ == "__main__":
     jd = datetime2JD(datetime.datetime(2018, 6, 15, 7, 15, 0))
     velocity = 41500 #m/s
 
-    print('Dynamic pressure:', dynamicPressure(lat, lon, height, jd, velocity), 'Pa')
\ No newline at end of file
+    print('Dynamic pressure:', dynamicPressure(lat, lon, height, jd, velocity), 'Pa')
+
+
+    ### Compare the PCHIP integral and the light curve mass to the scipy implementation ###
+
+    np.random.seed(0)
+
+    max_rel_diff_int = 0.0
+    max_rel_diff_mass = 0.0
+    for i in range(300):
+
+        # Random light curves with noisy magnitudes, repeated times and a varying number of points
+        n_points = np.random.randint(2, 50)
+        time_test = np.sort(np.random.uniform(0, 1, n_points))
+        mag_test = np.random.normal(0, 2, n_points)
+
+        intens_test = 840.0*10**(-0.4*mag_test)
+        intens_int_scipy = scipy.interpolate.PchipInterpolator(time_test, intens_test).integrate(time_test[0], 
+            time_test[-1])
+        max_rel_diff_int = max(max_rel_diff_int, 
+            abs(_pchipIntegral(time_test, intens_test) - intens_int_scipy)/abs(intens_int_scipy))
+
+        # Unsorted points from multiple stations
+        time_test = np.random.permutation(np.round(time_test, 2))
+        velocity_test = np.random.uniform(11000, 72000)
+
+        # Compute the mass in the same way as calcMassLightCurve does without numba
+        sort_idx = np.argsort(time_test, kind='stable')
+        time_avg, mag_avg = averageClosePoints(time_test[sort_idx], mag_test[sort_idx], 0.005)
+        if len(time_avg) < 2:
+            continue
+        mass_scipy = calcMass(np.array(time_avg), np.array(mag_avg), velocity_test)
+
+        mass = calcMassLightCurve(time_test, mag_test, 0.005, velocity_test)
+
+        max_rel_diff_mass = max(max_rel_diff_mass, abs(mass - mass_scipy)/abs(mass_scipy))
+
+
+    print('Max relative difference from scipy PCHIP integral:', max_rel_diff_int)
+    print('Max relative difference from scipy light curve mass:', max_rel_diff_mass)
+
+    if (max_rel_diff_int > 1e-10) or (max_rel_diff_mass > 1e-10):
+        raise AssertionError("The PCHIP integral does not match scipy.interpolate.PchipInterpolator!")
+
+    ### ###
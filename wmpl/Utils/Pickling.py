@@ -2,17 +2,30 @@
 
 from __future__ import print_function, absolute_import
 
+import io
 import os
 import sys
 import pickle
 
+# Use zstandard for compressing pickle files if it is available
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+
+except ImportError:
+    ZSTD_AVAILABLE = False
+
 
 from wmpl.Utils.OSTools import mkdirP
 
 
+# Magic number at the beginning of zstandard compressed files
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
 
 
-def savePickle(obj, dir_path, file_name):
+def savePickle(obj, dir_path, file_name, compress=False):
     """ Dump the given object into a file using Python 'pickling'. The file can be loaded into Python
         ('unpickled') afterwards for further use.
 
@@ -21,12 +34,23 @@ def savePickle(obj, dir_path, file_name):
         dir_path: [str] Path of the directory where the pickle file will be stored.
         file_name: [str] Name of the file where the object will be stored.
 
+    Keyword arguments:
+        compress: [bool] Compress the file with zstandard, if it is installed. Compressed files can only be
+            loaded with loadPickle, so they are pickled with the highest protocol instead of the Python 2
+            compatible one. False by default.
+
     """
 
     mkdirP(dir_path)
 
     with open(os.path.join(dir_path, file_name), 'wb') as f:
-        pickle.dump(obj, f, protocol=2)
+
+        if compress and ZSTD_AVAILABLE:
+            with zstandard.ZstdCompressor(level=3).stream_writer(f) as writer:
+                pickle.dump(obj, writer, protocol=pickle.HIGHEST_PROTOCOL)
+
+        else:
+            pickle.dump(obj, f, protocol=2)
 
 
 
@@ -41,6 +65,19 @@ def loadPickle(dir_path, file_name):
 
     with open(os.path.join(dir_path, file_name), 'rb') as f:
 
+        # Decompress files compressed with zstandard
+        if f.read(len(ZSTD_MAGIC)) == ZSTD_MAGIC:
+
+            if not ZSTD_AVAILABLE:
+                raise ImportError("The zstandard package is needed to load the compressed pickle file: {:s}"\
+                    .format(os.path.join(dir_path, file_name)))
+
+            f.seek(0)
+            f = io.BytesIO(zstandard.ZstdDecompressor().decompressobj().decompress(f.read()))
+
+        else:
+            f.seek(0)
+
         # Python 2
         if sys.version_info[0] < 3:
             p = pickle.load(f)
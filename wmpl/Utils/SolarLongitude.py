@@ -1233,7 +1233,7 @@ def jd2SolLonVSOP(jd):
     """
 
     # Number of millennia since 2000
-    T = (jd - 2451545.0)/365250.0
+    T = (np.asarray(jd) - 2451545.0)/365250.0
 
     terms = [L0, L1, L2, L3, L4, L5]
     term_sizes = [len(L0), len(L1), len(L2), len(L3), len(L4), len(L5)]
@@ -1266,10 +1266,10 @@ def jd2SolLonSteyaert(jd):
         Meteor Organization, 19, 31-34.
 
     Arguments:
-        jd: [float] julian date
+        jd: [float or ndarray] julian date, or an array of Julian dates
 
     Return:
-        [float] solar longitude in radians, J2000.0 epoch
+        [float or ndarray] solar longitude in radians, J2000.0 epoch
 
     """
 
@@ -1296,8 +1296,12 @@ def jd2SolLonSteyaert(jd):
     B3 = 5.84
     C3 = 6283.07585
 
+    A0, B0, C0 = np.array(A0), np.array(B0), np.array(C0)
+    A1, B1, C1 = np.array(A1), np.array(B1), np.array(C1)
+    A2, B2, C2 = np.array(A2), np.array(B2), np.array(C2)
+
     # Number of millennia since 2000
-    T = (jd - 2451545.0)/365250.0
+    T = (np.asarray(jd) - 2451545.0)/365250.0
 
     # Mean solar longitude
     L0 = 4.8950627 + 6283.07585*T - 0.0000099*T**2
@@ -1305,10 +1309,10 @@ def jd2SolLonSteyaert(jd):
     # Wrap L0 to [0, 2pi] range
     L0 = L0%(2*np.pi)
 
-    # Periodical terms
-    S0 = np.sum([A0[i]*np.cos((B0[i] + C0[i]*T)%(2*np.pi)) for i in range(28)])
-    S1 = np.sum([A1[i]*np.cos((B1[i] + C1[i]*T)%(2*np.pi)) for i in range(3)])
-    S2 = np.sum([A2[i]*np.cos((B2[i] + C2[i]*T)%(2*np.pi)) for i in range(2)])
+    # Periodical terms (the terms are along the last axis, so all Julian dates are computed at once)
+    S0 = np.sum(A0*np.cos((B0 + np.multiply.outer(T, C0))%(2*np.pi)), axis=-1)
+    S1 = np.sum(A1*np.cos((B1 + np.multiply.outer(T, C1))%(2*np.pi)), axis=-1)
+    S2 = np.sum(A2*np.cos((B2 + np.multiply.outer(T, C2))%(2*np.pi)), axis=-1)
     S3 = A3*np.cos((B3 + C3*T)%(2*np.pi))
 
     # Solar longitude of J2000.0
@@ -32,6 +32,7 @@
 from __future__ import print_function, division, absolute_import
 
 import math
+import functools
 import numpy as np
 from datetime import datetime, timedelta, MINYEAR
 
@@ -40,6 +41,7 @@ from wmpl.Config import config
 import wmpl.Utils.Earth
 import wmpl.Utils.GeoidHeightEGM96
 from wmpl.Utils.Math import vectNorm, vectMag, rotateVector, cartesianToSpherical, sphericalToCartesian
+from wmpl.Utils.NumbaTools import NUMBA_AVAILABLE, njit
 
 
 ### CONSTANTS ###
@@ -252,6 +254,46 @@ def jd2Date(jd, UT_corr=0, dt_obj=False):
 
 
 
+def jd2Date_vect(jd):
+    """ Converts an array of Julian dates to datetime objects at once. The result is the same as running 
+        jd2Date(jd, dt_obj=True) on every element, including the rounding to microseconds and the use of 
+        year 1 for dates out of range.
+
+    Arguments:
+        jd: [ndarray] Julian dates.
+
+    Return:
+        [ndarray] Array of datetime objects.
+
+    """
+
+    jd = np.array(jd, dtype=np.float64, ndmin=1)
+
+    # Split the Julian date into whole days and microseconds in the same way as timedelta does
+    day_frac, days = np.modf(jd)
+    us_frac, us_whole = np.modf(day_frac*86400000000.0)
+    us = days.astype(np.int64)*86400000000 + us_whole.astype(np.int64)
+
+    # Round the leftover fraction to the closest microsecond, with halves rounded to an even total
+    us_round = np.rint(us_frac).astype(np.int64)
+    half = np.abs(us_frac) == 0.5
+    us_round[half] = (us[half]%2)*np.sign(us_frac[half]).astype(np.int64)
+    us += us_round
+
+
+    # Dates which are out of the datetime range are set to year 1, as in jd2Date
+    epoch_us = np.datetime64(JULIAN_EPOCH, 'us')
+    epoch_jd_us = J2000_JD.days*86400000000
+    min_us = (np.datetime64(datetime.min, 'us') - epoch_us).astype(np.int64) + epoch_jd_us
+    max_us = (np.datetime64(datetime.max, 'us') - epoch_us).astype(np.int64)
+    us[(us < min_us) | (us > max_us)] = min_us
+
+    dates = epoch_us + (us - epoch_jd_us).astype('timedelta64[us]')
+
+    return dates.astype(object)
+
+
+
 def unixTime2JD(ts, tu):
     """ Converts UNIX time to Julian date. 
     
@@ -1047,6 +1089,90 @@ def correctedEclipticCoord(L_g, B_g, v_g, earth_vel):
 
 ### Precession ###
 
+def equatorialPrecessionAngles(start_epoch, final_epoch):
+    """ Compute the precession angles zeta, z and theta between two epochs.
+
+        Implemented from: Jean Meeus - Astronomical Algorithms, 2nd edition, pages 134-135
+
+    Arguments:
+        start_epoch: [float] Julian date of the starting epoch
+        final_epoch: [float] Julian date of the final epoch
+
+    Return:
+        (zeta, z, theta): [tuple of floats] precession angles in radians
+
+    """
+
+    T = (start_epoch - J2000_JD.days)/36525.0
+    t = (final_epoch - start_epoch)/36525.0
+
+    # Calculate correction parameters (polynomials are evaluated using Horner's scheme)
+    zeta_z_t1 = 2306.2181 + (1.39656 - 0.000139*T)*T
+    zeta  = ((( 0.017998*t + (0.30188 - 0.000344*T))*t + zeta_z_t1)*t)/3600
+    z     = ((( 0.018203*t + (1.09468 + 0.000066*T))*t + zeta_z_t1)*t)/3600
+    theta = (((-0.041833*t - (0.42665 + 0.000217*T))*t + (2004.3109 - (0.85330 + 0.000217*T)*T))*t)/3600
+
+    # Convert parameters to radians
+    zeta, z, theta = map(math.radians, (zeta, z, theta))
+
+    return zeta, z, theta
+
+
+
+# Precession matrix used when the two epochs are the same
+PRECESSION_IDENTITY = np.eye(3)
+PRECESSION_IDENTITY.flags.writeable = False
+
+
+@functools.lru_cache(maxsize=32)
+def equatorialPrecessionMatrix(start_epoch, final_epoch):
+    """ Compute the rotation matrix which precesses equatorial cartesian coordinates from one epoch to 
+        another. The rotation is equivalent to the equatorialCoordPrecession function. The matrix only 
+        depends on the two epochs, so the results are cached.
+
+    Arguments:
+        start_epoch: [float] Julian date of the starting epoch
+        final_epoch: [float] Julian date of the final epoch
+
+    Return:
+        prec_mat: [3x3 ndarray] precession rotation matrix. If the epochs are within 1e-6 days of each 
+            other, PRECESSION_IDENTITY is returned.
+
+    """
+
+    # Skip the computation if the epochs are the same (e.g. the observations are already in J2000)
+    if abs(final_epoch - start_epoch) < 1e-6:
+        return PRECESSION_IDENTITY
+
+    zeta, z, theta = equatorialPrecessionAngles(start_epoch, final_epoch)
+
+    # Rotation around the Z axis by zeta
+    rot_zeta = np.array([
+        [np.cos(zeta), -np.sin(zeta), 0.0],
+        [np.sin(zeta),  np.cos(zeta), 0.0],
+        [         0.0,           0.0, 1.0]])
+
+    # Rotation around the Y axis by theta
+    rot_theta = np.array([
+        [np.cos(theta), 0.0, -np.sin(theta)],
+        [          0.0, 1.0,            0.0],
+        [np.sin(theta), 0.0,  np.cos(theta)]])
+
+    # Rotation around the Z axis by z
+    rot_z = np.array([
+        [np.cos(z), -np.sin(z), 0.0],
+        [np.sin(z),  np.cos(z), 0.0],
+        [      0.0,        0.0, 1.0]])
+
+    prec_mat = np.dot(rot_z, np.dot(rot_theta, rot_zeta))
+
+    # The cached matrix is shared between callers, so make sure it's not modified
+    prec_mat.flags.writeable = False
+
+    return prec_mat
+
+
+
 def equatorialCoordPrecession(start_epoch, final_epoch, ra, dec):
     """ Precess right Ascension and declination from one epoch to another, taking only precession into 
         account.
@@ -1065,16 +1191,8 @@ def equatorialCoordPrecession(start_epoch, final_epoch, ra, dec):
     """
 
 
-    T = (start_epoch - J2000_JD.days)/36525.0
-    t = (final_epoch - start_epoch)/36525.0
-
     # Calculate correction parameters
-    zeta  = ((2306.2181 + 1.39656*T - 0.000139*T**2)*t + (0.30188 - 0.000344*T)*t**2 + 0.017998*t**3)/3600
-    z     = ((2306.2181 + 1.39656*T - 0.000139*T**2)*t + (1.09468 + 0.000066*T)*t**2 + 0.018203*t**3)/3600
-    theta = ((2004.3109 - 0.85330*T - 0.000217*T**2)*t - (0.42665 + 0.000217*T)*t**2 - 0.041833*t**3)/3600
-
-    # Convert parameters to radians
-    zeta, z, theta = map(math.radians, (zeta, z, theta))
+    zeta, z, theta = equatorialPrecessionAngles(start_epoch, final_epoch)
 
     # Calculate the next set of parameters
     A = np.cos(dec)  *np.sin(ra + zeta)
@@ -1103,6 +1221,70 @@ equatorialCoordPrecession_vect = np.vectorize(equatorialCoordPrecession, exclude
 
 
 
+@njit(cache=True, fastmath=True)
+def _equatorialCoordPrecessionMatrixNumba(ra, dec, prec_mat):
+    """ Numba kernel for equatorialCoordPrecessionMatrix, see that function for details. """
+
+    ra_corr = np.empty_like(ra)
+    dec_corr = np.empty_like(dec)
+
+    for i in range(ra.shape[0]):
+
+        cos_dec = np.cos(dec[i])
+
+        # Direction vector
+        x = cos_dec*np.cos(ra[i])
+        y = cos_dec*np.sin(ra[i])
+        z = np.sin(dec[i])
+
+        # Rotated direction vector
+        xr = prec_mat[0, 0]*x + prec_mat[0, 1]*y + prec_mat[0, 2]*z
+        yr = prec_mat[1, 0]*x + prec_mat[1, 1]*y + prec_mat[1, 2]*z
+        zr = prec_mat[2, 0]*x + prec_mat[2, 1]*y + prec_mat[2, 2]*z
+
+        ra_corr[i] = np.arctan2(yr, xr)%(2*np.pi)
+        dec_corr[i] = np.arctan2(zr, np.sqrt(xr**2 + yr**2))
+
+    return ra_corr, dec_corr
+
+
+
+def equatorialCoordPrecessionMatrix(ra, dec, prec_mat):
+    """ Precess right ascension and declination using a precomputed precession matrix. The whole arrays of
+        coordinates are rotated at once.
+
+    Arguments:
+        ra: [float or ndarray] non-corrected right ascension in radians
+        dec: [float or ndarray] non-corrected declination in radians
+        prec_mat: [3x3 ndarray] precession matrix, see equatorialPrecessionMatrix
+
+    Return:
+        (ra, dec): [tuple of floats or ndarrays] precessed equatorial coordinates in radians
+
+    """
+
+    # Nothing to do if the epochs are the same, only wrap right ascension to [0, 2*pi] range
+    if prec_mat is PRECESSION_IDENTITY:
+        return np.mod(ra, 2*np.pi), dec
+
+    # Use the compiled kernel for arrays if numba is available
+    if NUMBA_AVAILABLE and (np.ndim(ra) == 1) and (np.ndim(dec) == 1):
+        return _equatorialCoordPrecessionMatrixNumba(np.ascontiguousarray(ra, dtype=np.float64), 
+            np.ascontiguousarray(dec, dtype=np.float64), np.ascontiguousarray(prec_mat, dtype=np.float64))
+
+    # Rotate all direction vectors with one matrix multiplication
+    x, y, z = np.tensordot(prec_mat, np.array(raDec2ECI(ra, dec)), axes=1)
+
+    # Wrap right ascension to [0, 2*pi] range
+    ra_corr = np.arctan2(y, x)%(2*np.pi)
+
+    # Use arctan2 for the declination, as it is well conditioned close to the poles
+    dec_corr = np.arctan2(z, np.hypot(x, y))
+
+    return ra_corr, dec_corr
+
+
+
 def eclipticRectangularPrecession(start_jd, end_jd, x, y, z):
     """ Precess ecliptic rectangular coordinates from one epoch to the other.
 